@@ -1,10 +1,191 @@
 #!/usr/bin/env python3
 # 3_json_csv_example.py
+#
+# Usage: cat people.json | python3 3_json_csv_example.py [--stream]
+#
+# --stream parses the JSON while it arrives: each person is written as a CSV
+# row as soon as it has been read, and only one person is kept in memory.
 
-import sys, json, csv
+import sys, json, csv, codecs, re
+
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",:]}"
+
+# bytes read from the pipe at a time in --stream mode
+READ_SIZE = 2**16
+
+# where the scanner stops: inside arrays and objects, inside strings, after a number
+STRUCTURE = re.compile(r'["\[\]{}]')
+STRING_END = re.compile(r'["\\]')
+SCALAR_END = re.compile(r'[\s,:\]}]')
+
+
+class JSONStream:
+    """
+    Reads JSON values one at a time from a binary stream such as sys.stdin.buffer.
+    Before waiting for more input, calls on_wait (e.g. to flush the output).
+
+    A value that continues in the next read is not parsed again after every read: the
+    scanner finds its end by looking only at the new text, and the value is then parsed
+    once. Members that are not wanted are skipped the same way without being parsed (only
+    their brackets and strings are followed), so memory stays at about one read.
+    """
+
+    def __init__(self, stream, on_wait=None):
+        self.stream = stream
+        self.on_wait = on_wait
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.raw_decode = json.JSONDecoder().raw_decode
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read more text into the buffer; returns False at the end of the input."""
+        if self.eof:
+            return False
+        if self.on_wait is not None:
+            self.on_wait()
+        data = self.stream.read1(READ_SIZE)
+        self.eof = not data
+        # drop what has been parsed already
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return True
+
+    def next_char(self):
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("unexpected end of JSON input")
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars, and return it."""
+        c = self.next_char()
+        if c not in chars:
+            raise ValueError(f"expected one of {chars!r} but found {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Parse and return the next complete JSON value."""
+        c = self.next_char()
+        try:
+            value, end = self.raw_decode(self.buffer, self.pos)
+            # strings, arrays and objects end at their closing character; a number such
+            # as "12" or "1." at the end of the buffer may go on in the next read
+            if c in '"[{' or self.eof or (end < len(self.buffer) and self.buffer[end] in DELIMITERS):
+                self.pos = end
+                return value
+        except json.JSONDecodeError:
+            if self.eof:
+                raise
+        # the value continues in the next read
+        return json.loads(self.scan(keep=True))
+
+    def skip(self):
+        """Move past the next JSON value without parsing it."""
+        self.scan(keep=False)
+
+    def scan(self, keep):
+        """
+        Move past the next JSON value by following its brackets and strings, reading more
+        input as needed, and return its text if keep. Every character is scanned once.
+        """
+        c = self.next_char()
+        parts = []
+        start = i = self.pos
+        depth = 0
+        in_string = escape = False
+        scalar = c not in '"[{'
+        if not scalar:
+            in_string = c == '"'
+            depth = 0 if in_string else 1
+            i += 1
+        end = None
+        while True:
+            buffer = self.buffer
+            while end is None:
+                if escape:
+                    if i == len(buffer):
+                        break
+                    i += 1
+                    escape = False
+                elif scalar:
+                    m = SCALAR_END.search(buffer, i)
+                    if m is None:
+                        i = len(buffer)
+                        break
+                    end = m.start()
+                elif in_string:
+                    m = STRING_END.search(buffer, i)
+                    if m is None:
+                        i = len(buffer)
+                        break
+                    i = m.end()
+                    if m.group() == "\\":
+                        escape = True
+                    else:
+                        in_string = False
+                        if depth == 0:
+                            end = i
+                else:
+                    m = STRUCTURE.search(buffer, i)
+                    if m is None:
+                        i = len(buffer)
+                        break
+                    i = m.end()
+                    if m.group() == '"':
+                        in_string = True
+                    elif m.group() in "[{":
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            end = i
+            if end is not None:
+                break
+            # keep what was scanned (if wanted) and read on; fill drops it from the buffer
+            if keep:
+                parts.append(buffer[start:i])
+            self.pos = i
+            if not self.fill():
+                if not scalar:
+                    raise ValueError("unexpected end of JSON input")
+                end = self.pos
+                break
+            start = i = self.pos
+        if keep:
+            parts.append(self.buffer[start:end])
+        self.pos = end
+        return "".join(parts)
+
+    def items(self, key):
+        """Yield the elements of the array stored under key in the top-level object."""
+        self.expect("{")
+        if self.next_char() == "}":
+            return
+        while True:
+            name = self.value()
+            self.expect(":")
+            if name == key:
+                self.expect("[")
+                if self.next_char() != "]":
+                    while True:
+                        yield self.value()
+                        if self.expect(",]") == "]":
+                            break
+                else:
+                    self.pos += 1
+            else:
+                self.skip()  # another member: skip it without parsing
+            if self.expect(",}") == "}":
+                return
 
-# Read the JSON from the pipe
-data = json.loads(sys.stdin.read())
 
 # Create a CSV writer that writes to stdout
 writer = csv.DictWriter(sys.stdout, fieldnames=['name', 'age'])
@@ -12,6 +193,15 @@ writer = csv.DictWriter(sys.stdout, fieldnames=['name', 'age'])
 # Write the header row
 writer.writeheader()
 
-# Iterate through the JSON data and write to CSV
-for person in data['people']:
-    writer.writerow(person)
+if "--stream" in sys.argv[1:]:
+    # Write each person as soon as it has been parsed; flush the rows written
+    # so far whenever the parser has to wait for more input from the pipe
+    for person in JSONStream(sys.stdin.buffer, on_wait=sys.stdout.flush).items('people'):
+        writer.writerow(person)
+else:
+    # Read the JSON from the pipe
+    data = json.loads(sys.stdin.read())
+
+    # Iterate through the JSON data and write to CSV
+    for person in data['people']:
+        writer.writerow(person)
@@ -3,5 +3,9 @@ import pandas as pd
 my_csv_file = "squirrel-census.csv"
 my_tsv_file = "squirrel-census.tsv"
 
-df = pd.read_csv(my_csv_file, delimiter=",")
-df.to_csv(my_tsv_file, sep="\t", index=False)
\ No newline at end of file
+# read and write 10000 rows at a time, so files larger than memory work too;
+# dtype=str and keep_default_na=False copy the values as they are
+chunks = pd.read_csv(my_csv_file, delimiter=",", chunksize=10000, dtype=str, keep_default_na=False)
+for i, chunk in enumerate(chunks):
+    # the first chunk creates the file and writes the header, the others append
+    chunk.to_csv(my_tsv_file, sep="\t", index=False, header=(i == 0), mode="w" if i == 0 else "a")
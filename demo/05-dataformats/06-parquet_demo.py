@@ -0,0 +1,35 @@
+import os
+import time
+
+import pandas as pd
+
+# Parquet and Feather need pyarrow: pip install pyarrow
+my_csv_file = "squirrel-census.csv"
+my_parquet_file = "squirrel-census.parquet"
+my_feather_file = "squirrel-census.feather"
+
+df = pd.read_csv(my_csv_file)
+print(f"Memory as read: {df.memory_usage(deep=True).sum()} bytes")
+
+# smaller types: integers that fit in 8 or 16 bits, and text columns with few
+# distinct values (like Shift: AM/PM) stored as categories
+for name in df.columns:
+    if pd.api.types.is_integer_dtype(df[name]):
+        df[name] = pd.to_numeric(df[name], downcast="integer")
+    elif not pd.api.types.is_numeric_dtype(df[name]) and df[name].nunique() <= len(df) / 2:
+        df[name] = df[name].astype("category")
+print(f"Memory downcast: {df.memory_usage(deep=True).sum()} bytes")
+print(df.dtypes)
+
+df.to_parquet(my_parquet_file, index=False, compression="zstd")
+df.to_feather(my_feather_file, compression="zstd")
+
+for file_name, read in [(my_csv_file, pd.read_csv), (my_parquet_file, pd.read_parquet),
+                        (my_feather_file, pd.read_feather)]:
+    start = time.perf_counter()
+    read(file_name)
+    print(f"{file_name}: {os.path.getsize(file_name)} bytes, read in {time.perf_counter() - start:.4f} s")
+
+# columnar files can read just the columns you need
+shifts = pd.read_parquet(my_parquet_file, columns=["Hectare", "Shift"])
+print(shifts.head())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Merge the word,count CSV files written by process-book.py (one per job-array task)
+into corpus-wide word counts.
+Usage: python merge-counts.py <output_file> <count_file> [<count_file> ...]
+                              [--top-k K] [--top-output FILE] [--fan-in F] [--processes P]
+
+Every input file is sorted by word, so the files are merged like the merge step of
+merge sort: heapq.merge reads one line at a time from each file, and the counts of
+equal words arrive next to each other and are summed. Memory use does not depend on
+the size of the files. With more files than --fan-in, groups of files are first merged
+into temporary files (in parallel with --processes) and those are merged again: a
+tree reduce, which keeps the number of files open at once bounded.
+
+Besides CSV, the inputs may be the binary .npz or .parquet files process-book.py writes
+for output files with those extensions (files written with --top-k are not sorted by
+word and cannot be merged). Parquet files are read in record batches; an .npz file's
+arrays are loaded at once, which is compact but not constant memory.
+"""
+
+import argparse
+import csv
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+from itertools import groupby
+from multiprocessing import Pool
+from operator import itemgetter
+
+# files merged at once; stays well below the usual limit of 1024 open files
+DEFAULT_FAN_IN = 256
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge sorted word,count files into corpus-wide counts")
+    parser.add_argument("output_file", help="CSV file to write the merged word,count to")
+    parser.add_argument("count_files", nargs="+", metavar="count_file",
+                        help="word count files written by process-book.py (.csv, .npz or .parquet)")
+    parser.add_argument("--top-k", type=int, default=0, metavar="K",
+                        help="also report the K most frequent words")
+    parser.add_argument("--top-output", default=None, metavar="FILE",
+                        help="CSV file to write the top K words to (default: print them)")
+    parser.add_argument("--fan-in", type=int, default=DEFAULT_FAN_IN, metavar="F",
+                        help=f"files merged at once (default: {DEFAULT_FAN_IN})")
+    parser.add_argument("--processes", type=int, default=1, metavar="P",
+                        help="processes merging groups of files in parallel (default: 1)")
+    args = parser.parse_args()
+    if args.top_k < 0 or args.fan_in < 2 or args.processes < 1:
+        print("Error: --top-k must not be negative, --fan-in must be at least 2 "
+              "and --processes at least 1", file=sys.stderr)
+        sys.exit(1)
+    return args
+
+
+def read_rows(path):
+    """
+    Yield (word, count) from a word count file: CSV, or .npz/.parquet as written by
+    process-book.py.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npz":
+        import numpy as np
+        with np.load(path) as data:
+            blob = data["words"].tobytes()
+            offsets = data["offsets"].tolist()
+            counts = data["counts"].tolist()
+        for a, b, count in zip(offsets, offsets[1:], counts):
+            yield blob[a:b].decode("utf-8"), count
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(columns=["word", "count"]):
+            yield from zip(batch.column(0).to_pylist(), batch.column(1).to_pylist())
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            for word, count in reader:
+                yield word, int(count)
+
+
+def read_counts(path):
+    """
+    Yield (word, count) from a word count file, checking that it is sorted by word.
+    """
+    previous = None
+    for word, count in read_rows(path):
+        if previous is not None and word <= previous:
+            raise ValueError(f"{path} is not sorted by word ({previous!r} before {word!r})")
+        previous = word
+        yield word, count
+
+
+def merge_counts(paths):
+    """
+    k-way merge of sorted word,count files: yield (word, total count) in sorted order.
+    """
+    merged = heapq.merge(*(read_counts(path) for path in paths), key=itemgetter(0))
+    for word, rows in groupby(merged, key=itemgetter(0)):
+        yield word, sum(count for _, count in rows)
+
+
+def write_counts(rows, output_file):
+    """
+    Write (word, count) rows as a word,count CSV file.
+    Returns (number of distinct words, total count).
+    """
+    unique_words = 0
+    total = 0
+    with open(output_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["word", "count"])
+        for word, count in rows:
+            writer.writerow([word, count])
+            unique_words += 1
+            total += count
+    return unique_words, total
+
+
+def merge_group(args):
+    """
+    Worker: merge one group of files into output_file. args = (paths, output_file).
+    """
+    paths, output_file = args
+    write_counts(merge_counts(paths), output_file)
+    return output_file
+
+
+def tree_reduce(paths, fan_in, processes, tmp_dir):
+    """
+    Merge groups of fan_in files into temporary files in tmp_dir, level by level,
+    until at most fan_in files are left. Returns the remaining files.
+    """
+    level = 0
+    with Pool(processes=processes) as pool:
+        while len(paths) > fan_in:
+            groups = [paths[i:i + fan_in] for i in range(0, len(paths), fan_in)]
+            tasks = [(group, os.path.join(tmp_dir, f"level-{level}-{i}.csv"))
+                     for i, group in enumerate(groups)]
+            paths = pool.map(merge_group, tasks)
+            print(f"Merged {sum(len(group) for group in groups)} files into {len(paths)}")
+            level += 1
+    return paths
+
+
+class TopK:
+    """
+    The k rows with the highest counts seen so far, kept in a min-heap of size k.
+    Wraps a stream of (word, count) rows without changing it. Among equal counts,
+    the word that came first (alphabetically first, for sorted input) wins.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self.seen = 0
+
+    def watch(self, rows):
+        for word, count in rows:
+            item = (count, -self.seen, word)
+            self.seen += 1
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, item)
+            elif item > self.heap[0]:
+                heapq.heapreplace(self.heap, item)
+            yield word, count
+
+    def rows(self):
+        """Return the top rows, most frequent first."""
+        return [(word, count) for count, _, word in sorted(self.heap, reverse=True)]
+
+
+def main():
+    args = parse_args()
+    tmp_dir = None
+    paths = args.count_files
+    try:
+        if len(paths) > args.fan_in:
+            # temporary files next to the output, i.e. on scratch rather than in /tmp
+            tmp_dir = tempfile.mkdtemp(prefix="merge-counts-",
+                                       dir=os.path.dirname(os.path.abspath(args.output_file)))
+            paths = tree_reduce(paths, args.fan_in, args.processes, tmp_dir)
+        rows = merge_counts(paths)
+        top = TopK(args.top_k) if args.top_k else None
+        if top is not None:
+            rows = top.watch(rows)
+        unique_words, total = write_counts(rows, args.output_file)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"Merged {len(args.count_files)} files")
+    print(f"Total tokens (words): {total}, unique words (lemmatized): {unique_words}")
+    if total:
+        print(f"Unique words per token: {unique_words / total:.4f}")
+    print(f"Wrote word counts to {args.output_file}")
+    if top is not None:
+        if args.top_output:
+            write_counts(top.rows(), args.top_output)
+            print(f"Wrote the top {args.top_k} words to {args.top_output}")
+        else:
+            for word, count in top.rows():
+                print(f"{word},{count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,28 +2,177 @@
 """
 Process a text file: tokenize, lemmatize with NLTK WordNetLemmatizer,
 count unique words, and write word counts to an output file.
-Usage: python process_text.py <input.txt> <output_file>
+Usage: python process_text.py <input.txt> <output_file> [--cache-size N] [--lemma-cache DB]
+                              [--workers N] [--chunk-size CHARS] [--nltk-data DIR]
+       python process_text.py (--manifest FILE | --glob PATTERN) --output-dir DIR
+                              [--task-id I] [--num-tasks N] [--workers N] [...]
+
+Batch mode processes many books in one run, so a job array does not pay for starting
+Python and loading NLTK once per file: the inputs come from a manifest (one path per
+line) or a glob pattern, task I of N takes every N-th file starting at the I-th, and a
+pool of --workers processes (each loading the tagger and WordNet once) processes them,
+writing <output-dir>/results-<name>.<format> for each input. The task id and count default
+to the Slurm job array (SLURM_ARRAY_TASK_ID etc.).
+
+With --incremental, a book is only processed again if it changed: next to each output
+file, <output_file>.cache.json records the input's path, a BLAKE2 hash of its content
+and the parameters that determine the result; when all of them match and the output
+file is still there, the output is reused as it is.
+
+With --stats, <output_file>.stats.json records the wall time, the number of items and
+items per second of every stage (read, tokenize, pos_tag, lemmatize, count, write), so
+the sidecars of many array tasks can be compared; with --trace-memory (slower) also the
+peak memory traced by tracemalloc during each stage. --profile FILE saves a cProfile
+dump of the main process for pstats or snakeviz.
+
+The output format follows the output file's extension: .csv (word,count text, sorted
+by word), .npz (NumPy arrays: the UTF-8 bytes of all words, their offsets and the
+counts, read back by merge-counts.py without parsing any text) or .parquet (word and
+count columns; needs pyarrow). Binary files are checked after writing. --top-k K
+writes only the K most frequent words, most frequent first, picked with a bounded heap
+instead of sorting the whole vocabulary.
 """
 
+import argparse
+import contextlib
+import cProfile
+import fcntl
+import functools
+import heapq
+import itertools
+import json
+import os
 import re
+import resource
+import sqlite3
 import sys
+import time
+import tracemalloc
+import types
 from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 import nltk
 from nltk.stem import WordNetLemmatizer
+from nltk.tag import PerceptronTagger
 from nltk.corpus import wordnet
 
-# Ensure NLTK data is available
-nltk.download("wordnet", quiet=True)
-nltk.download("omw-1.4", quiet=True)
-nltk.download("averaged_perceptron_tagger_eng", quiet=True)
+from batch_inputs import (batch_outputs, cache_record, cached_result, list_inputs,
+                          save_cache_record, task_settings)
+
+# NLTK packages the script needs, and the resource path nltk.data.find looks for
+NLTK_RESOURCES = {
+    "wordnet": "corpora/wordnet",
+    "omw-1.4": "corpora/omw-1.4",
+    "averaged_perceptron_tagger_eng": "taggers/averaged_perceptron_tagger_eng",
+}
+DEFAULT_NLTK_DATA = os.environ.get("NLTK_DATA", os.path.expanduser("~/nltk_data")).split(os.pathsep)[0]
+# distinct (word, POS) pairs kept in memory; a novel has a few thousand to tens of thousands
+DEFAULT_CACHE_SIZE = 2**16
+# characters of text read, tokenized and tagged at a time (about 45,000 words)
+CHUNK_SIZE = 2**18
+# with --workers, tokens of the previous chunk the tagger sees again, so tags at chunk
+# boundaries rarely change
+CONTEXT_WORDS = 8
+# part of every --incremental cache record; a new version makes all books count again
+RESULT_VERSION = 2
+# output formats by file extension; anything else is written as CSV
+BINARY_FORMATS = (".npz", ".parquet")
+# what the items counted by each stage are
+STAGE_UNITS = {"read": "characters", "tokenize": "tokens", "pos_tag": "tokens",
+               "lemmatize": "tokens", "count": "tokens", "write": "words"}
 
 
 def parse_args():
-    if len(sys.argv) != 3:
-        print("Usage: python process_text.py <input.txt> <output_file>", file=sys.stderr)
+    parser = argparse.ArgumentParser(description="Count lemmatized words in a text file")
+    parser.add_argument("input_path", nargs="?", help="text file to process")
+    parser.add_argument("output_path", nargs="?", help="CSV file to write word,count to")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f"in-memory lemma cache entries (default: {DEFAULT_CACHE_SIZE})")
+    parser.add_argument("--lemma-cache", default=None, metavar="DB",
+                        help="SQLite file with lemmas shared between runs (e.g. all job-array tasks)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes that tag and lemmatize chunks in parallel, "
+                             "or whole files in batch mode (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="CHARS",
+                        help=f"characters of text per chunk (default: {CHUNK_SIZE})")
+    parser.add_argument("--nltk-data", default=DEFAULT_NLTK_DATA, metavar="DIR",
+                        help=f"directory to find or download NLTK data in (default: {DEFAULT_NLTK_DATA})")
+    inputs = parser.add_mutually_exclusive_group()
+    inputs.add_argument("--manifest", default=None, metavar="FILE",
+                        help="batch mode: file listing one input path per line")
+    inputs.add_argument("--glob", default=None, metavar="PATTERN",
+                        help="batch mode: input files matching PATTERN (quote it)")
+    parser.add_argument("--output-dir", default=None, metavar="DIR",
+                        help="batch mode: directory for the per-file results")
+    parser.add_argument("--output-format", choices=("csv", "npz", "parquet"), default="csv",
+                        help="batch mode: format of the per-file results (default: csv)")
+    parser.add_argument("--task-id", type=int, default=None,
+                        help="batch mode: this task's index, 0 .. num_tasks-1 (default: from Slurm)")
+    parser.add_argument("--num-tasks", type=int, default=None,
+                        help="batch mode: number of tasks sharing the inputs (default: from Slurm)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse the existing output if the input's content has not changed")
+    parser.add_argument("--top-k", type=int, default=0, metavar="K",
+                        help="write only the K most frequent words (default: all words)")
+    parser.add_argument("--stats", action="store_true",
+                        help="write per-stage timings to <output_file>.stats.json")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record peak memory per stage with tracemalloc (slower)")
+    parser.add_argument("--profile", default=None, metavar="FILE",
+                        help="save a cProfile dump of the main process to FILE")
+    args = parser.parse_args()
+    batch = args.manifest is not None or args.glob is not None
+    if batch and (args.input_path is not None or args.output_dir is None):
+        print("Error: batch mode takes --output-dir instead of input and output paths", file=sys.stderr)
+        sys.exit(1)
+    if not batch and (args.input_path is None or args.output_path is None or args.output_dir is not None):
+        print("Error: input and output paths are required (or use --manifest/--glob with --output-dir)",
+              file=sys.stderr)
+        sys.exit(1)
+    if args.cache_size < 0:
+        print("Error: --cache-size must not be negative", file=sys.stderr)
+        sys.exit(1)
+    if args.top_k < 0:
+        print("Error: --top-k must not be negative", file=sys.stderr)
+        sys.exit(1)
+    if args.workers < 1 or args.chunk_size < 1:
+        print("Error: --workers and --chunk-size must be at least 1", file=sys.stderr)
         sys.exit(1)
-    return sys.argv[1], sys.argv[2]
+    return args
+
+
+def missing_nltk_resources():
+    """Return the NLTK packages that nltk.data.find cannot find locally."""
+    missing = []
+    for package, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(package)
+    return missing
+
+
+def ensure_nltk_data(data_dir):
+    """
+    Make sure the NLTK resources are available, downloading them into data_dir only if
+    they are missing. Normally this is just a few file lookups. When many job-array tasks
+    start at once, the first one downloads under an exclusive lock on a file in data_dir;
+    the others wait for it and then find the data instead of downloading it again.
+    """
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    if not missing_nltk_resources():
+        return
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, ".download.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # another task may have downloaded the data while we waited for the lock
+        for package in missing_nltk_resources():
+            print(f"Downloading NLTK package {package} to {data_dir}", file=sys.stderr)
+            if not nltk.download(package, download_dir=data_dir, quiet=True):
+                print(f"Error: could not download NLTK package {package}", file=sys.stderr)
+                sys.exit(1)
 
 
 def tokenize(text):
@@ -49,7 +198,228 @@ def _penn_to_wn(tag):
     return wordnet.NOUN
 
 
-def lemmatize_words(words, lemmatizer):
+class LemmaCache:
+    """
+    Memoize lemmatizer.lemmatize(word, pos). Most tokens of a book repeat a few thousand
+    distinct (word, POS) pairs, so nearly every lookup is answered from memory.
+
+    Lookups go to a bounded in-memory LRU cache first, then (optionally) to a SQLite file
+    that is shared between runs, and only then to WordNet. New lemmas are written to the
+    SQLite file in one transaction by close(), so concurrent job-array tasks mostly read.
+    """
+
+    def __init__(self, lemmatizer, maxsize=DEFAULT_CACHE_SIZE, db_path=None):
+        self.lemmatizer = lemmatizer
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.db = None
+        self.db_hits = 0
+        self.new_lemmas = []
+        if db_path is not None:
+            # wait for other tasks that are writing instead of failing right away
+            self.db = sqlite3.connect(db_path, timeout=60)
+            self.db.execute("CREATE TABLE IF NOT EXISTS lemmas "
+                            "(word TEXT, pos TEXT, lemma TEXT, PRIMARY KEY (word, pos))")
+            self.db.commit()
+        self._cached = functools.lru_cache(maxsize=maxsize)(self._lookup)
+
+    def _lookup(self, word, pos):
+        if self.db is not None:
+            row = self.db.execute("SELECT lemma FROM lemmas WHERE word = ? AND pos = ?",
+                                  (word, pos)).fetchone()
+            if row is not None:
+                self.db_hits += 1
+                return row[0]
+        lemma = self.lemmatizer.lemmatize(word, pos=pos)
+        if self.db is not None:
+            self.new_lemmas.append((word, pos, lemma))
+        return lemma
+
+    def lemmatize(self, word, pos="n"):
+        return self._cached(word, pos)
+
+    def stats(self):
+        """Return (hits, misses, db_hits) of the lookups so far."""
+        info = self._cached.cache_info()
+        return info.hits, info.misses, self.db_hits
+
+    def close(self):
+        """Store the lemmas computed in this run in the SQLite file and close it."""
+        if self.db is None:
+            return
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO lemmas VALUES (?, ?, ?)", self.new_lemmas)
+        self.db.close()
+        self.db = None
+
+
+class StageTimer:
+    """
+    Wall time, number of items and, while tracemalloc is tracing, peak traced memory,
+    summed over all the times each stage of the pipeline ran.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a block of code as stage name; set .items on the yielded object to the
+        number of items the block processed.
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        progress = types.SimpleNamespace(items=0)
+        start = time.perf_counter()
+        try:
+            yield progress
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] if tracing else None
+            self.add(name, time.perf_counter() - start, progress.items, peak)
+
+    def timed(self, name, iterable, size=len):
+        """Yield from iterable, timing the production of each item as stage name."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as progress:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                progress.items = size(item)
+            yield item
+
+    def add(self, name, seconds, items=0, peak_bytes=None):
+        totals = self.stages.setdefault(name, {"seconds": 0.0, "items": 0, "peak_bytes": None})
+        totals["seconds"] += seconds
+        totals["items"] += items
+        if peak_bytes is not None:
+            totals["peak_bytes"] = max(totals["peak_bytes"] or 0, peak_bytes)
+
+    def merge(self, stages):
+        """Add the .stages of another StageTimer (e.g. one from a worker process)."""
+        for name, totals in stages.items():
+            self.add(name, totals["seconds"], totals["items"], totals["peak_bytes"])
+
+    def summary(self):
+        summary = {}
+        for name, totals in self.stages.items():
+            seconds = totals["seconds"]
+            summary[name] = {
+                "seconds": round(seconds, 6),
+                "items": totals["items"],
+                "unit": STAGE_UNITS.get(name, "items"),
+                "items_per_second": round(totals["items"] / seconds, 1) if seconds > 0 else None,
+                "peak_traced_mb": (round(totals["peak_bytes"] / 2**20, 3)
+                                   if totals["peak_bytes"] is not None else None),
+            }
+        return summary
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    """
+    Yield the text of f in pieces of roughly chunk_size characters.
+    Pieces end at a paragraph break if possible, otherwise at a line break or other
+    whitespace, so no word is ever split between two pieces.
+    """
+    rest = ""
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        text = rest + block
+        cut = text.rfind("\n\n")
+        if cut < 0:
+            cut = text.rfind("\n")
+        if cut < 0:
+            cut = max(text.rfind(" "), text.rfind("\t"))
+        if cut < 0:
+            # no whitespace at all yet: keep reading
+            rest = text
+            continue
+        yield text[:cut + 1]
+        rest = text[cut + 1:]
+    if rest:
+        yield rest
+
+
+class StreamTagger:
+    """
+    Tag a text that arrives as a stream of token lists exactly as nltk.pos_tag tags the
+    whole text in one call. NLTK's averaged perceptron tags from left to right, looking at
+    the two words before and after each word and at the tags it gave the two words before
+    it, so those words and tags are carried from one list to the next, and the last two
+    tokens of a list are only tagged once the words after them are known.
+    The loop is the one in PerceptronTagger.tag, with its state kept between calls.
+    """
+
+    def __init__(self, tagger=None):
+        # one tagger for the whole text; nltk.pos_tag loads the model again on every call
+        self.tagger = tagger if tagger is not None else PerceptronTagger()
+        self.prev, self.prev2 = self.tagger.START
+        # normalized words before the pending tokens
+        self.before = list(self.tagger.START)
+        self.pending = []
+
+    def tag(self, tokens, last=False):
+        """
+        Add tokens, the next part of the text, and return the (word, Penn_tag) pairs that
+        can be tagged now: all tokens so far but the last two, or all of them if last.
+        """
+        tagger = self.tagger
+        words = self.pending + tokens
+        context = self.before + [tagger.normalize(w) for w in words] + (tagger.END if last else [])
+        n = len(words) if last else max(len(words) - 2, 0)
+        prev, prev2 = self.prev, self.prev2
+        tagged = []
+        for i in range(n):
+            word = words[i]
+            tag = tagger.tagdict.get(word)
+            if not tag:
+                tag, _ = tagger.model.predict(tagger._get_features(i, word, context, prev, prev2))
+            tagged.append((word, tag))
+            prev2, prev = prev, tag
+        self.prev, self.prev2 = prev, prev2
+        # context[k + 2] is words[k]
+        self.before = context[n:n + 2]
+        self.pending = words[n:]
+        return tagged
+
+
+def context_chunks(token_chunks):
+    """
+    Turn a stream of token lists into (before, tokens, after) triples for tag_with_context,
+    which lets worker processes tag the lists independently of each other.
+    The tagger looks at the two words before and after each word and at the tags it
+    gave the previous two, so each list is tagged together with the last CONTEXT_WORDS
+    tokens of the text before it and the first two tokens after it. This is an
+    approximation: the tags of those context tokens in turn depend on the text before
+    them, so a word near a chunk boundary can occasionally get a different tag (and
+    lemma) than when the whole text is tagged in one call; StreamTagger has no such error,
+    but needs the lists in order.
+    """
+    before = []
+    pending = None
+    for tokens in token_chunks:
+        if not tokens:
+            continue
+        if pending is not None:
+            yield before, pending, tokens[:2]
+            before = (before + pending)[-CONTEXT_WORDS:]
+        pending = tokens
+    if pending is not None:
+        yield before, pending, []
+
+
+def tag_with_context(before, tokens, after):
+    """Tag before + tokens + after and return the (word, Penn_tag) pairs of tokens only."""
+    tagged = nltk.pos_tag(before + tokens + after)
+    return tagged[len(before):len(before) + len(tokens)]
+
+
+def lemmatize_tagged(tagged, lemmatizer):
     """
     Lemmatize each token to its dictionary form (lemma).
     Lemmatization reduces inflected forms to a single base form using a
@@ -57,32 +427,409 @@ def lemmatize_words(words, lemmatizer):
     We use POS tagging so verb forms are reduced correctly (WordNetLemmatizer
     needs the part of speech: e.g. "whispering" as verb -> "whisper").
     """
-    # pos_tag returns (word, Penn_tag); we need WordNet pos for the lemmatizer
-    tagged = nltk.pos_tag(words)
-    return [lemmatizer.lemmatize(w, pos=_penn_to_wn(tag)) for w, tag in tagged]
+    # tagged holds (word, Penn_tag); we need WordNet pos for the lemmatizer
+    return (lemmatizer.lemmatize(w, pos=_penn_to_wn(tag)) for w, tag in tagged)
+
+
+# per-process lemmatizer of the worker processes, set up by init_worker
+worker_lemmatizer = None
+
+
+def init_worker(cache_size, db_path, data_dir, trace_memory=False):
+    """
+    Load the tagger model and WordNet once per worker process instead of once per chunk.
+    """
+    global worker_lemmatizer
+    if trace_memory:
+        tracemalloc.start()
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    nltk.pos_tag(["warm", "up"])
+    wordnet.ensure_loaded()
+    worker_lemmatizer = LemmaCache(WordNetLemmatizer(), cache_size, db_path)
+
+
+def worker_report():
+    """
+    Return (worker pid, cache stats, new lemmas) of this worker; the new lemmas go back to
+    the main process, which is the only one writing the cache file.
+    """
+    new_lemmas = worker_lemmatizer.new_lemmas
+    worker_lemmatizer.new_lemmas = []
+    return os.getpid(), worker_lemmatizer.stats(), new_lemmas
+
+
+def collect_report(report, worker_stats, lemmatizer):
+    """Record a worker_report() in the main process."""
+    pid, stats, new_lemmas = report
+    # stats are running totals per worker, so keep the latest of each
+    worker_stats[pid] = stats
+    lemmatizer.new_lemmas.extend(new_lemmas)
+
+
+def summed_stats(worker_stats):
+    return tuple(sum(column) for column in zip(*worker_stats.values())) or (0, 0, 0)
+
+
+def submit_bounded(executor, func, items, max_pending):
+    """
+    Yield the results of func(item) for all items as they complete, submitting at most
+    max_pending items to the executor at a time so memory stays bounded.
+    """
+    pending = set()
+    items = iter(items)
+    while True:
+        for item in items:
+            pending.add(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                break
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
 
 
-def process_file(input_path, output_path):
+def count_tokens(tag, lemmatizer, timer):
+    """
+    Tag one chunk by calling tag() and lemmatize it, timing each stage with timer.
+    Returns (lemma Counter, number of tokens).
+    """
+    with timer.stage("pos_tag") as progress:
+        tagged = tag()
+        progress.items = len(tagged)
+    with timer.stage("lemmatize") as progress:
+        # Lemmas: base forms of those words (e.g. "run" for all three), so we count unique concepts.
+        lemmas = list(lemmatize_tagged(tagged, lemmatizer))
+        progress.items = len(lemmas)
+    with timer.stage("count") as progress:
+        counts = Counter(lemmas)
+        progress.items = len(lemmas)
+    return counts, len(tagged)
+
+
+def count_chunk(chunk):
+    """
+    Worker: tag and lemmatize one (before, tokens, after) chunk.
+    Returns (lemma Counter, number of tokens, stage timings, worker_report()).
+    """
+    timer = StageTimer()
+    counts, num_tokens = count_tokens(functools.partial(tag_with_context, *chunk),
+                                      worker_lemmatizer, timer)
+    return counts, num_tokens, timer.stages, worker_report()
+
+
+def count_parallel(chunks, lemmatizer, workers, data_dir, timer):
+    """
+    Tag and lemmatize chunks in a pool of worker processes and merge their Counters.
+    At most 2 * workers chunks are in flight, so memory stays bounded. The workers' stage
+    timings are added to timer, so they are summed over all workers.
+    Returns (total tokens, Counter, cache stats summed over the workers).
+    """
+    total_tokens = 0
+    counts = Counter()
+    worker_stats = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(lemmatizer.maxsize, lemmatizer.db_path, data_dir,
+                                       tracemalloc.is_tracing())) as executor:
+        for chunk_counts, num_tokens, stages, report in submit_bounded(executor, count_chunk, chunks,
+                                                                       2 * workers):
+            with timer.stage("count"):
+                counts.update(chunk_counts)
+            total_tokens += num_tokens
+            timer.merge(stages)
+            collect_report(report, worker_stats, lemmatizer)
+    return total_tokens, counts, summed_stats(worker_stats)
+
+
+def count_serial(token_chunks, lemmatizer, timer):
+    """
+    Tag and lemmatize the token lists one after another with a StreamTagger, so the tags
+    are the same as when the whole text is tagged in one call.
+    Returns (total tokens, Counter).
+    """
+    tagger = StreamTagger()
+    total_tokens = 0
+    counts = Counter()
+    # the final call tags the last two tokens, which wait for the words after them
+    calls = itertools.chain((functools.partial(tagger.tag, tokens) for tokens in token_chunks),
+                            [functools.partial(tagger.tag, [], last=True)])
+    for tag in calls:
+        chunk_counts, num_tokens = count_tokens(tag, lemmatizer, timer)
+        with timer.stage("count"):
+            counts.update(chunk_counts)
+        total_tokens += num_tokens
+    return total_tokens, counts
+
+
+def tokenized_chunks(f, chunk_size, timer):
+    """Yield the token list of each chunk of f, timing the read and tokenize stages."""
+    for text in timer.timed("read", read_chunks(f, chunk_size)):
+        with timer.stage("tokenize") as progress:
+            tokens = tokenize(text)
+            progress.items = len(tokens)
+        yield tokens
+
+
+def top_counts(counts, k):
+    """
+    The k most frequent (word, count) pairs, most frequent first; among equal counts the
+    alphabetically first words win. heapq keeps only k candidates, O(n log k) instead of
+    sorting the whole vocabulary.
+    """
+    return heapq.nsmallest(k, counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def write_counts(rows, output_path):
+    """
+    Write (word, count) rows (a list) in the format given by output_path's extension.
+    .npz and .parquet files are checked with check_counts after writing.
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == ".npz":
+        import numpy as np
+        encoded = [word.encode("utf-8") for word, _ in rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(word) for word in encoded], out=offsets[1:])
+        counts = np.array([count for _, count in rows], dtype=np.int64)
+        # 4-byte integers where they are large enough; compressed, as most counts are small
+        np.savez_compressed(output_path, words=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+                            offsets=offsets.astype(smallest_uint(offsets)),
+                            counts=counts.astype(smallest_uint(counts)))
+        check_counts(output_path, len(rows))
+    elif extension == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table({"word": pa.array([word for word, _ in rows], type=pa.string()),
+                          "count": pa.array([count for _, count in rows], type=pa.int64())})
+        pq.write_table(table, output_path)
+        check_counts(output_path, len(rows))
+    else:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("word,count\n")
+            f.writelines(f"{word},{count}\n" for word, count in rows)
+
+
+def smallest_uint(values):
+    """np.uint32 if all of values (non-negative integers) fit into it, else np.uint64."""
+    import numpy as np
+    return np.uint32 if len(values) == 0 or values.max() < 2**32 else np.uint64
+
+
+def check_counts(output_path, num_rows):
+    """
+    Check that the .npz or .parquet file just written holds num_rows words with
+    consistent arrays; raise ValueError if not.
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == ".npz":
+        import numpy as np
+        with np.load(output_path) as data:
+            words, offsets, counts = data["words"], data["offsets"], data["counts"]
+            ok = (len(offsets) == num_rows + 1 and len(counts) == num_rows
+                  and offsets[0] == 0 and offsets[-1] == len(words)
+                  and bool(np.all(offsets[1:] >= offsets[:-1])))
+    else:
+        import pyarrow.parquet as pq
+        metadata = pq.read_metadata(output_path)
+        ok = metadata.num_rows == num_rows and metadata.schema.names == ["word", "count"]
+    if not ok:
+        raise ValueError(f"{output_path} does not hold the {num_rows} words that were written")
+
+
+def process_file(input_path, output_path, lemmatizer, workers=1, chunk_size=CHUNK_SIZE,
+                 data_dir=DEFAULT_NLTK_DATA, timer=None, top_k=0):
+    """
+    Stream input_path through tokenize -> tag -> lemmatize chunk by chunk and fold the
+    lemmas into one Counter, so memory does not grow with the size of the input.
+    The tags are exactly those of tagging the whole text at once, except with workers > 1,
+    where the chunks are tagged and lemmatized in parallel (see context_chunks).
+    The time spent in each stage is added to timer (a StageTimer), if given.
+    With top_k, only the top_k most frequent words are written.
+    Returns (total tokens, unique words, lemma cache stats).
+    """
+    timer = timer if timer is not None else StageTimer()
     with open(input_path, encoding="utf-8", errors="replace") as f:
-        text = f.read()
-    # Tokens: individual words from the text (e.g. "running", "runs", "run" are 3 tokens).
-    words = tokenize(text)
-    lemmatizer = WordNetLemmatizer()
-    # Lemmas: base forms of those words (e.g. "run" for all three), so we count unique concepts.
-    lemmas = lemmatize_words(words, lemmatizer)
-    counts = Counter(lemmas)
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("word,count\n")
-        for word, count in sorted(counts.items()):
-            f.write(f"{word},{count}\n")
-    return len(words), len(counts)
+        # Tokens: individual words from the text (e.g. "running", "runs", "run" are 3 tokens).
+        token_chunks = tokenized_chunks(f, chunk_size, timer)
+        if workers > 1:
+            total_tokens, counts, stats = count_parallel(context_chunks(token_chunks), lemmatizer,
+                                                          workers, data_dir, timer)
+        else:
+            total_tokens, counts = count_serial(token_chunks, lemmatizer, timer)
+            stats = lemmatizer.stats()
+    with timer.stage("write") as progress:
+        rows = top_counts(counts, top_k) if top_k else sorted(counts.items())
+        write_counts(rows, output_path)
+        progress.items = len(rows)
+    return total_tokens, len(counts), stats
+
+
+def save_stats(output_path, input_path, total_tokens, unique_words, workers, wall_seconds, timer):
+    """
+    Write the run's timings to <output_path>.stats.json. With workers > 1 the pos_tag,
+    lemmatize and count seconds are summed over the workers, so they can exceed wall_seconds.
+    """
+    stats = {
+        "input": input_path,
+        "output": output_path,
+        "total_tokens": total_tokens,
+        "unique_words": unique_words,
+        "workers": workers,
+        "wall_seconds": round(wall_seconds, 6),
+        "tokens_per_second": round(total_tokens / wall_seconds, 1) if wall_seconds > 0 else None,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": timer.summary(),
+    }
+    with open(output_path + ".stats.json", "w") as f:
+        json.dump(stats, f, indent=2)
+
+
+def result_params(top_k=0, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Parameters that determine the word counts of a given input. The chunks are tagged
+    independently only with workers > 1, so only then does the chunk size change the tags.
+    """
+    # the tagger model and WordNet come with the NLTK version
+    return {"result_version": RESULT_VERSION, "nltk": nltk.__version__, "top_k": top_k,
+            "chunk_size": chunk_size if workers > 1 else None}
+
+
+def process_incremental(input_path, output_path, lemmatizer, incremental, workers=1,
+                        chunk_size=CHUNK_SIZE, data_dir=DEFAULT_NLTK_DATA, write_stats=False, top_k=0):
+    """
+    process_file, except that with incremental an unchanged input's output is reused,
+    and with write_stats the stage timings are saved next to the output.
+    Returns (total tokens, unique words, lemma cache stats, whether the output was reused).
+    """
+    if incremental:
+        record = cache_record(input_path, result_params(top_k, workers, chunk_size))
+        result = cached_result(record, output_path, ("total_tokens", "unique_words"))
+        if result is not None:
+            return result + (lemmatizer.stats(), True)
+    timer = StageTimer()
+    start = time.perf_counter()
+    total_tokens, unique_words, stats = process_file(input_path, output_path, lemmatizer, workers,
+                                                     chunk_size, data_dir, timer, top_k)
+    if write_stats:
+        save_stats(output_path, input_path, total_tokens, unique_words, workers,
+                   time.perf_counter() - start, timer)
+    if incremental:
+        save_cache_record(record, {"total_tokens": total_tokens, "unique_words": unique_words},
+                          output_path)
+    return total_tokens, unique_words, stats, False
+
+
+def process_one(job, lemmatizer):
+    """
+    Process one (input_path, output_path, chunk_size, incremental, write_stats, top_k) job
+    of a batch.
+    Returns (input_path, (total tokens, unique words, reused) or None, error message or None).
+    """
+    input_path, output_path, chunk_size, incremental, write_stats, top_k = job
+    try:
+        total_tokens, unique_words, _, reused = process_incremental(
+            input_path, output_path, lemmatizer, incremental, chunk_size=chunk_size,
+            write_stats=write_stats, top_k=top_k)
+    except (OSError, ValueError, ImportError) as e:
+        # e.g. an unreadable input, a failed check_counts or Parquet output without pyarrow
+        return input_path, None, str(e)
+    return input_path, (total_tokens, unique_words, reused), None
+
+
+def process_one_worker(job):
+    """Worker: process_one with the worker's lemmatizer; adds worker_report()."""
+    return process_one(job, worker_lemmatizer) + (worker_report(),)
+
+
+def process_batch(args, lemmatizer):
+    """
+    Process this task's slice of the batch inputs, serially or in a pool of --workers.
+    Returns (lemma cache stats, number of files that failed).
+    """
+    task_id, num_tasks = task_settings(args.task_id, args.num_tasks)
+    if not 0 <= task_id < num_tasks:
+        print(f"Error: task id {task_id} is not in 0 .. {num_tasks - 1}", file=sys.stderr)
+        sys.exit(1)
+    input_paths = list_inputs(args.manifest, args.glob)
+    # strided slice: task i gets files i, i + n, i + 2n, ...
+    pairs = batch_outputs(input_paths, args.output_dir, args.output_format)[task_id::num_tasks]
+    print(f"Task {task_id} of {num_tasks}: processing {len(pairs)} of {len(input_paths)} files")
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(input_path, output_path, args.chunk_size, args.incremental, args.stats, args.top_k)
+            for input_path, output_path in pairs]
+
+    failed = 0
+    reused = 0
+    worker_stats = {}
+
+    def record(input_path, result, error):
+        nonlocal failed, reused
+        if error is not None:
+            print(f"Error: {input_path}: {error}", file=sys.stderr)
+            failed += 1
+        else:
+            total_tokens, unique_words, unchanged = result
+            reused += unchanged
+            print(f"{input_path}: {total_tokens} tokens, {unique_words} unique words"
+                  + (" (unchanged)" if unchanged else ""))
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(lemmatizer.maxsize, lemmatizer.db_path, args.nltk_data,
+                                           args.trace_memory)) as executor:
+            for input_path, result, error, report in submit_bounded(executor, process_one_worker, jobs,
+                                                                    2 * args.workers):
+                record(input_path, result, error)
+                collect_report(report, worker_stats, lemmatizer)
+        stats = summed_stats(worker_stats)
+    else:
+        for job in jobs:
+            record(*process_one(job, lemmatizer))
+        stats = lemmatizer.stats()
+    print(f"Wrote {len(pairs) - failed} word count files to {args.output_dir}")
+    if args.incremental:
+        print(f"Reused {reused} results of unchanged inputs, computed {len(pairs) - failed - reused}")
+    if failed:
+        print(f"Error: {failed} files failed", file=sys.stderr)
+    return stats, failed
 
 
 def main():
-    input_path, output_path = parse_args()
-    total_tokens, unique_words = process_file(input_path, output_path)
-    print(f"Total tokens (words): {total_tokens}, unique words (lemmatized): {unique_words}")
-    print(f"Wrote word counts to {output_path}")
+    args = parse_args()
+    ensure_nltk_data(args.nltk_data)
+    lemmatizer = LemmaCache(WordNetLemmatizer(), args.cache_size, args.lemma_cache)
+    failed = 0
+    if args.trace_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        if args.output_dir is not None:
+            (hits, misses, db_hits), failed = process_batch(args, lemmatizer)
+        else:
+            total_tokens, unique_words, (hits, misses, db_hits), reused = process_incremental(
+                args.input_path, args.output_path, lemmatizer, args.incremental, args.workers,
+                args.chunk_size, args.nltk_data, args.stats, args.top_k)
+            print(f"Total tokens (words): {total_tokens}, unique words (lemmatized): {unique_words}")
+            if reused:
+                print(f"Input unchanged, kept {args.output_path}")
+            else:
+                print(f"Wrote word counts to {args.output_path}")
+    finally:
+        lemmatizer.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+    hit_rate = 100 * hits / (hits + misses) if hits + misses else 0.0
+    print(f"Lemma cache: {hits} hits, {misses} misses ({hit_rate:.1f}% hit rate)")
+    if args.lemma_cache:
+        print(f"Lemma cache file {args.lemma_cache}: {db_hits} of the misses found, "
+              f"{misses - db_hits} lemmatized")
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
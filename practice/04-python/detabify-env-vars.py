@@ -1,25 +1,20 @@
 #!/usr/bin/env python
 
-import io
-import re
 import os
 
-input = os.getenv('INPUT')
+# the same block-based conversion as detabify.py; see its docstring for how the
+# output differs from the old regex version (doubled quotes, line endings kept)
+from detabify import convert
 
-def convert(file_name):
-    # Open csv file
-    file_name="new_mock_data"
+# INPUT may be given with or without the .tsv extension
+input = os.getenv('INPUT', 'new_mock_data')
+if input.endswith('.tsv'):
+    input = input[:-len('.tsv')]
 
-    csv = io.open(file_name + ".csv", mode="w", encoding="utf-8")
-
-    # Convert file_name.tsv to file_name.csv
-    with io.open(file_name + ".tsv", mode="r", encoding="utf-8") as tsv:
-        for line in tsv:
-            csv.write(re.sub('\t',',',re.sub('(^|[\t])([^\t]*\,[^\t\n]*)', r'\1"\2"', line)))
-
-    csv.close()
+# PROCESSES converts a large file on several cores, e.g. PROCESSES=$SLURM_CPUS_PER_TASK
+processes = int(os.getenv('PROCESSES', '1'))
 
 if __name__ == '__main__':
     print('Start converting ...')
-    convert(input)
+    convert(input, processes)
     print('Converted!')
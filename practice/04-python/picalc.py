@@ -1,23 +1,190 @@
 #!/usr/bin/env python
 
-# calculate using Lebniz formula
-
-# Initialize denominator
-k = 1
- 
-# Initialize sum
-s = 0
- 
-# calc to 100M models
-for i in range(100000000):
-  # even index elements are positive
-  if i % 2 == 0:
-    s += 4/k
-  else:
-    # odd index elements are negative
-    s -= 4/k
- 
-  # denominator is odd
-  k += 2
-     
-print(s)
+"""
+Calculate pi using the Leibniz formula: pi = 4/1 - 4/3 + 4/5 - 4/7 + ...
+Usage: python picalc.py [num_terms] [--method {loop,numpy,euler}] [--processes P]
+                        [--block-size N]
+
+Methods:
+- loop:  the original pure-Python loop, one term (and one branch) per iteration.
+- numpy: terms are evaluated in blocks with NumPy. Each positive term is paired with
+         the following negative one, 4/(4j+1) - 4/(4j+3) = 8/((4j+1)(4j+3)), so no
+         cancellation happens inside a block; blocks are summed pairwise by NumPy and
+         the block sums are added with math.fsum (compensated, exactly rounded).
+         --processes splits the term range across a multiprocessing pool.
+- euler: the Euler transform of the Leibniz series, pi = 2 * sum n!/(2n+1)!!,
+         which gains one binary digit per term instead of needing 10**k terms for k digits.
+
+After each power of ten of terms the script prints the digits of pi that are correct
+and the elapsed time, so the output doubles as a CPU-throughput smoke test.
+"""
+
+import argparse
+import math
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+# terms evaluated per NumPy block (2**20 pairs: a few MB of temporaries)
+BLOCK_SIZE = 2**20
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Calculate pi with the Leibniz formula")
+    parser.add_argument("num_terms", type=int, nargs="?", default=100000000,
+                        help="number of terms of the series (default: 100000000)")
+    parser.add_argument("--method", choices=("loop", "numpy", "euler"), default="numpy",
+                        help="how to evaluate the series (default: numpy)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes for the numpy method (default: 1)")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE,
+                        help=f"terms per NumPy block (default: {BLOCK_SIZE})")
+    args = parser.parse_args()
+    if args.num_terms < 1 or args.processes < 1 or args.block_size < 2:
+        parser.error("num_terms and --processes must be at least 1, --block-size at least 2")
+    return args
+
+
+def leibniz_loop(start, stop):
+    """
+    Sum terms start .. stop-1 with a plain Python loop (the original version).
+    """
+    # denominator is odd
+    k = 2 * start + 1
+    s = 0
+    for i in range(start, stop):
+        # even index elements are positive
+        if i % 2 == 0:
+            s += 4/k
+        else:
+            # odd index elements are negative
+            s -= 4/k
+        k += 2
+    return s
+
+
+def leibniz_block(start, stop):
+    """
+    Sum terms start .. stop-1 with NumPy; start must be even so the terms pair up.
+    Returns a Python float.
+    """
+    num_pairs = (stop - start) // 2
+    j = np.arange(start // 2, start // 2 + num_pairs, dtype=np.float64)
+    # (4j+1)(4j+3) computed in place to avoid extra temporaries
+    a = 4.0 * j + 1.0
+    j *= 4.0
+    j += 3.0
+    a *= j
+    np.divide(8.0, a, out=a)
+    s = float(np.sum(a))
+    if (stop - start) % 2:
+        # a leftover positive term at an even index
+        s += 4.0 / (2 * (stop - 1) + 1)
+    return s
+
+
+def leibniz_range(args):
+    """
+    Worker: sum terms start .. stop-1 block by block. args = (start, stop, block_size).
+    The partial sums of the blocks are combined with math.fsum.
+    """
+    start, stop, block_size = args
+    # keep block boundaries on even indices so pairs are never split
+    block_size -= block_size % 2
+    partials = []
+    for block_start in range(start, stop, block_size):
+        partials.append(leibniz_block(block_start, min(block_start + block_size, stop)))
+    return math.fsum(partials)
+
+
+def split_range(start, stop, parts, block_size):
+    """
+    Split start .. stop-1 into parts contiguous (start, stop, block_size) ranges
+    whose boundaries fall on even indices.
+    """
+    bounds = [start]
+    for i in range(1, parts):
+        b = start + (stop - start) * i // parts
+        bounds.append(max(bounds[-1], b - b % 2))
+    bounds.append(stop)
+    return [(a, b, block_size) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def euler_terms(num_terms):
+    """
+    Partial sum of the Euler-transformed series pi = 2 * sum_{n>=0} n!/(2n+1)!!.
+    Term n is term n-1 times n/(2n+1); stops early once terms no longer change the sum.
+    """
+    term = 2.0
+    s = 0.0
+    for n in range(num_terms):
+        if n > 0:
+            term *= n / (2 * n + 1)
+        if s + term == s:
+            break
+        s += term
+    return s
+
+
+def digits_correct(estimate):
+    """
+    Number of correct decimal digits of pi (capped at 16, the precision of a float).
+    """
+    error = abs(estimate - math.pi)
+    if error == 0:
+        return 16.0
+    return min(16.0, -math.log10(error))
+
+
+def checkpoints(num_terms):
+    """
+    10, 100, 1000, ... up to num_terms (always ending with num_terms).
+    """
+    points = []
+    n = 10
+    while n < num_terms:
+        points.append(n)
+        n *= 10
+    points.append(num_terms)
+    return points
+
+
+def report(terms, estimate, seconds):
+    rate = terms / seconds / 1e6 if seconds > 0 else float("inf")
+    print(f"{terms:>12d} terms  pi={estimate:.15f}  digits={digits_correct(estimate):5.2f}  "
+          f"time={seconds:8.3f}s  {rate:10.2f} Mterms/s")
+
+
+def main():
+    args = parse_args()
+    print(f"Leibniz series, method={args.method}, processes={args.processes}")
+    start_time = time.perf_counter()
+    if args.method == "euler":
+        for terms in checkpoints(min(args.num_terms, 100)):
+            report(terms, euler_terms(terms), time.perf_counter() - start_time)
+        return
+
+    # sum decade by decade so the running estimate can be reported along the way
+    partials = []
+    done = 0
+    pool = Pool(processes=args.processes) if args.processes > 1 else None
+    try:
+        for terms in checkpoints(args.num_terms):
+            if args.method == "loop":
+                partials.append(leibniz_loop(done, terms))
+            elif pool is not None:
+                ranges = split_range(done, terms, args.processes, args.block_size)
+                partials.extend(pool.map(leibniz_range, ranges))
+            else:
+                partials.append(leibniz_range((done, terms, args.block_size)))
+            done = terms
+            report(terms, math.fsum(partials), time.perf_counter() - start_time)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+if __name__ == "__main__":
+    main()
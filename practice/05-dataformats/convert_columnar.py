@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Convert between CSV, TSV, JSON and the columnar formats Parquet and Feather.
+Usage: python convert_columnar.py <input> <output> [--columns COL,COL,...]
+                                  [--compression {zstd,snappy,lz4,gzip,none}] [--no-downcast]
+                                  [--check]
+
+The formats are chosen by the file extensions (.csv, .tsv, .json, .parquet, .feather).
+Parquet and Feather store each column in binary with its data type, so reading them back
+needs no parsing and no type guessing. Before writing, each column gets the smallest type
+that holds its values: integers become int8/int16/int32 or their unsigned versions, floats
+become float32 when no digits are lost, and text columns with few distinct values become
+categorical (each value is stored once; the rows store small integer codes).
+--columns reads only the given columns; from Parquet and Feather, the other columns are
+not even read from disk. --check reads a Parquet or Feather output back and checks that
+it holds every value of the input with the downcast types. csv_to_tsv_pandas.py uses
+convert() for its Parquet and Feather output. Needs pandas and pyarrow (pip install pyarrow).
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+
+FORMATS = (".csv", ".tsv", ".json", ".parquet", ".feather")
+
+# Feather files can only be compressed with these
+FEATHER_COMPRESSION = ("zstd", "lz4", "none")
+
+# output formats that keep the data type of every column
+COLUMNAR_FORMATS = (".parquet", ".feather")
+
+# text columns with at most this fraction of distinct values become categorical
+CATEGORY_RATIO = 0.5
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert between CSV, TSV, JSON, Parquet and Feather")
+    parser.add_argument("input_file", help="file to read (" + ", ".join(FORMATS) + ")")
+    parser.add_argument("output_file", help="file to write (" + ", ".join(FORMATS) + ")")
+    parser.add_argument("--columns", default=None, metavar="COL,COL,...",
+                        help="read only these columns (default: all)")
+    parser.add_argument("--compression", choices=("zstd", "snappy", "lz4", "gzip", "none"),
+                        default="zstd", help="compression of Parquet and Feather output (default: zstd)")
+    parser.add_argument("--no-downcast", dest="downcast", action="store_false",
+                        help="keep the data types pandas infers")
+    parser.add_argument("--check", action="store_true",
+                        help="read the Parquet or Feather output back and compare it with the input")
+    args = parser.parse_args()
+    for path in (args.input_file, args.output_file):
+        if extension(path) not in FORMATS:
+            parser.error(f"{path}: unknown format, use one of " + ", ".join(FORMATS))
+    if extension(args.output_file) == ".feather" and args.compression not in FEATHER_COMPRESSION:
+        parser.error("Feather files can only be compressed with " + ", ".join(FEATHER_COMPRESSION))
+    if args.check and extension(args.output_file) not in COLUMNAR_FORMATS:
+        parser.error("--check needs a " + " or ".join(COLUMNAR_FORMATS) + " output file")
+    if args.columns is not None:
+        args.columns = args.columns.split(",")
+    return args
+
+
+def extension(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def read_table(path, columns=None):
+    """
+    Read a data file into a DataFrame, optionally only the given columns.
+    """
+    ext = extension(path)
+    if ext == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    if ext == ".feather":
+        return pd.read_feather(path, columns=columns)
+    if ext == ".json":
+        df = pd.read_json(path)
+        return df if columns is None else df[columns]
+    return pd.read_csv(path, sep="\t" if ext == ".tsv" else ",", usecols=columns)
+
+
+def write_table(df, path, compression="zstd"):
+    """
+    Write a DataFrame to a data file.
+    """
+    ext = extension(path)
+    compression = None if compression == "none" else compression
+    if ext == ".parquet":
+        df.to_parquet(path, index=False, compression=compression)
+    elif ext == ".feather":
+        df.to_feather(path, compression=compression or "uncompressed")
+    elif ext == ".json":
+        df.to_json(path, orient="records", indent=2)
+    else:
+        df.to_csv(path, sep="\t" if ext == ".tsv" else ",", index=False)
+
+
+def downcast(df, category_ratio=CATEGORY_RATIO):
+    """
+    Give every column of df the smallest data type that holds its values (in place).
+    """
+    for name in df.columns:
+        column = df[name]
+        if len(column) == 0 or pd.api.types.is_bool_dtype(column):
+            continue
+        if pd.api.types.is_integer_dtype(column):
+            df[name] = pd.to_numeric(column, downcast="unsigned" if column.min() >= 0 else "integer")
+        elif pd.api.types.is_float_dtype(column):
+            small = column.astype("float32")
+            # only if every value (or NaN) survives the round trip
+            if ((small.astype(column.dtype) == column) | column.isna()).all():
+                df[name] = small
+        elif pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+            if column.nunique() <= len(column) * category_ratio:
+                df[name] = column.astype("category")
+    return df
+
+
+def check_round_trip(original, df, path):
+    """
+    Read path back and check that it holds df with the same data types, and that its values
+    equal those of original (the data before downcasting). Raises AssertionError if not.
+    """
+    back = read_table(path)
+    pd.testing.assert_frame_equal(back, df)
+    pd.testing.assert_frame_equal(back.astype(original.dtypes.to_dict()), original)
+
+
+def convert(input_file, output_file, columns=None, compression="zstd", downcast_types=True, check=False):
+    """
+    Convert input_file to output_file (formats by extension), downcasting the column types
+    first if downcast_types. Returns the number of rows and the memory use of the data
+    before and after downcasting.
+    """
+    df = read_table(input_file, columns)
+    before = df.memory_usage(deep=True).sum()
+    original = df.copy() if check else None
+    if downcast_types:
+        downcast(df)
+    write_table(df, output_file, compression)
+    if check:
+        check_round_trip(original, df, output_file)
+    return len(df), before, df.memory_usage(deep=True).sum()
+
+
+def size(num_bytes):
+    return f"{num_bytes / 1e6:.1f} MB" if num_bytes >= 1e6 else f"{num_bytes / 1e3:.1f} kB"
+
+
+def main():
+    args = parse_args()
+    try:
+        _, before, after = convert(args.input_file, args.output_file, args.columns, args.compression,
+                                   args.downcast, args.check)
+    except ImportError:
+        logging.error("Parquet and Feather need pyarrow: pip install pyarrow")
+        sys.exit(1)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Conversion failed: {e}")
+        sys.exit(1)
+    except AssertionError as e:
+        logging.error(f"Round trip check failed: {e}")
+        sys.exit(1)
+
+    if args.check:
+        logging.info(f"Checked: {args.output_file} holds the same values as {args.input_file}")
+    logging.info(f"Memory: {size(before)} -> {size(after)}, file: "
+                 f"{size(os.path.getsize(args.input_file))} -> {size(os.path.getsize(args.output_file))}")
+    logging.info(f"Conversion complete! {args.input_file} -> {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+#!/bin/bash
+#SBATCH --account=ds2002
+#SBATCH --job-name=pi-benchmark
+#SBATCH --output=pi-benchmark-%j.out
+#SBATCH --error=pi-benchmark-%j.err
+#SBATCH --time=00:30:00
+#SBATCH --partition=standard
+#SBATCH --mem-per-cpu=8G
+#SBATCH --nodes=1
+#SBATCH --ntasks-per-node=1
+#SBATCH --cpus-per-task=8
+
+# The benchmark runs mp-pi.py with 1, 2, 4, ... up to $SLURM_CPUS_PER_TASK processes.
+# Compare the speedup and efficiency columns in the CSV files to choose --cpus-per-task for 04-mp-pi.sh.
+echo "Number of CPU cores assigned to the job: $SLURM_CPUS_PER_TASK"
+
+# strong scaling: the same total number of points split across more processes
+python ~/ds2002-course/practice/08-hpc/benchmark-pi.py pi-strong.csv --mode strong --points 10000000 100000000
+
+# weak scaling: the same number of points per process
+python ~/ds2002-course/practice/08-hpc/benchmark-pi.py pi-weak.csv --mode weak --points 10000000 --scripts mp-pi.py
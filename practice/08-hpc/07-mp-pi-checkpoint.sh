@@ -0,0 +1,27 @@
+#!/bin/bash
+#SBATCH --account=ds2002
+#SBATCH --job-name=pi-checkpoint
+#SBATCH --output=pi-checkpoint-%j.out
+#SBATCH --error=pi-checkpoint-%j.err
+#SBATCH --time=00:10:00
+#SBATCH --partition=standard
+#SBATCH --mem-per-cpu=8G
+#SBATCH --nodes=1
+#SBATCH --ntasks-per-node=1
+#SBATCH --cpus-per-task=8
+#SBATCH --signal=B:USR1@60          # send USR1 to this batch script 60 seconds before the time limit
+
+NUM_POINTS=100000000000
+OUTPUT_FILE=pi.csv
+CHECKPOINT_FILE=pi-checkpoint.json
+
+# Progress is saved to $CHECKPOINT_FILE every 60 seconds and when USR1/TERM arrives.
+# If the job hits the time limit, submit this script again: --resume picks up where it stopped.
+# The python script runs in the background so that the trap can forward the signal to it.
+python ~/ds2002-course/practice/08-hpc/mp-pi.py $NUM_POINTS $OUTPUT_FILE $SLURM_CPUS_PER_TASK \
+    --checkpoint $CHECKPOINT_FILE --resume &
+PID=$!
+trap 'kill -USR1 $PID' USR1
+# wait returns early when the trap fires, so wait again for python to write the checkpoint
+wait $PID
+wait $PID
@@ -0,0 +1,22 @@
+#!/bin/bash
+#SBATCH --account=ds2002
+#SBATCH --job-name=pi-array
+#SBATCH --output=pi-array-%A_%a.out
+#SBATCH --error=pi-array-%A_%a.err
+#SBATCH --time=00:05:00
+#SBATCH --partition=standard
+#SBATCH --mem-per-cpu=8G
+#SBATCH --nodes=1
+#SBATCH --ntasks-per-node=1
+#SBATCH --cpus-per-task=8
+#SBATCH --array=1-4
+
+# All array tasks share NUM_POINTS; each one computes its slice and writes one shard.
+# The task index, number of tasks and the shared seed are read from the Slurm environment
+# (SLURM_ARRAY_TASK_ID, SLURM_ARRAY_TASK_COUNT, SLURM_ARRAY_JOB_ID).
+NUM_POINTS=10000000000
+SHARD_DIR=pi-shards
+
+mkdir -p $SHARD_DIR
+python ~/ds2002-course/practice/08-hpc/mp-pi.py $NUM_POINTS $SHARD_DIR/shard-${SLURM_ARRAY_TASK_ID}.csv \
+    $SLURM_CPUS_PER_TASK --shard
@@ -0,0 +1,23 @@
+#!/bin/bash
+#SBATCH --account=ds2002
+#SBATCH --job-name=text-batch
+#SBATCH --output=text-batch-%A_%a.out
+#SBATCH --error=text-batch-%A_%a.err
+#SBATCH --partition=standard
+#SBATCH --time=00:10:00
+#SBATCH --mem=8G
+#SBATCH --nodes=1
+#SBATCH --ntasks-per-node=1
+#SBATCH --cpus-per-task=4
+#SBATCH --array=1-4
+
+# Each array task processes every 4th file matching the pattern (task 1: files 1, 5, 9, ...)
+# in one Python process with a pool of SLURM_CPUS_PER_TASK workers, instead of one task per file.
+# The task index and number of tasks are read from the Slurm environment.
+OUTPUT_DIR=results
+
+module load miniforge
+source activate ds2002
+# Assumed that you cloned the repo to ~/ds2002-course.
+python ~/ds2002-course/practice/08-hpc/process-text.py --glob 'data-*.txt' --output-dir $OUTPUT_DIR \
+    --processes $SLURM_CPUS_PER_TASK
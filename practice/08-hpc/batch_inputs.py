@@ -0,0 +1,108 @@
+"""
+Batch-mode helpers of practice/08-hpc/process-text.py and labs/07-hpc/process-book.py:
+which task of a Slurm job array this is, the list of input files, their output paths,
+and the --incremental cache records next to the outputs. Both directories keep a copy
+of this module, so each works on its own when copied to the cluster; keep them the same.
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import sys
+from collections import Counter
+
+
+def task_settings(task_id, num_tasks):
+    """
+    Fill in task id and task count from the Slurm job array environment where they were
+    not given on the command line; without either, this is the only task (0 of 1).
+    Array indices may start at any value (e.g. --array=1-5), so the task id is counted
+    from SLURM_ARRAY_TASK_MIN.
+    """
+    env = os.environ
+    if task_id is None:
+        task_id = int(env["SLURM_ARRAY_TASK_ID"]) - int(env.get("SLURM_ARRAY_TASK_MIN", 0)) \
+            if "SLURM_ARRAY_TASK_ID" in env else 0
+    if num_tasks is None:
+        num_tasks = int(env.get("SLURM_ARRAY_TASK_COUNT", 1))
+    return task_id, num_tasks
+
+
+def list_inputs(manifest, pattern):
+    """
+    Input files from a manifest (one path per line; blank lines and # comments are
+    skipped) or from a glob pattern (sorted, so every task sees the same order).
+    """
+    if pattern is not None:
+        return sorted(glob.glob(pattern))
+    with open(manifest) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def batch_outputs(input_paths, output_dir, extension):
+    """
+    Pair each input file with <output_dir>/results-<name>.<extension>, where <name> is the
+    input's file name without extension; two inputs with the same name are an error.
+    """
+    names = [os.path.splitext(os.path.basename(path))[0] for path in input_paths]
+    duplicated = sorted(name for name, count in Counter(names).items() if count > 1)
+    if duplicated:
+        print(f"Error: several inputs are named {', '.join(duplicated)}; their results would collide",
+              file=sys.stderr)
+        sys.exit(1)
+    return [(path, os.path.join(output_dir, f"results-{name}.{extension}"))
+            for path, name in zip(input_paths, names)]
+
+
+def content_hash(input_path):
+    """
+    BLAKE2 hash of the file's content, read through a memory map.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(input_path, "rb") as f:
+        # an empty file cannot be mapped
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                digest.update(mm)
+    return digest.hexdigest()
+
+
+def cache_record(input_path, params):
+    """
+    The record --incremental compares with the stored one: the input path, the hash of
+    its content and params, the parameters that determine the result.
+    """
+    return {"input": input_path, "blake2b": content_hash(input_path), "params": params}
+
+
+def cached_result(record, output_path, result_keys):
+    """
+    Return the integers stored under result_keys, as a tuple, if record matches
+    <output_path>.cache.json and the output file exists, else None.
+    A truncated or malformed cache file counts as a miss.
+    """
+    try:
+        with open(output_path + ".cache.json") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(stored, dict) or not os.path.exists(output_path) \
+            or {key: stored.get(key) for key in record} != record:
+        return None
+    result = tuple(stored.get(key) for key in result_keys)
+    if not all(isinstance(value, int) for value in result):
+        return None
+    return result
+
+
+def save_cache_record(record, result, output_path):
+    """
+    Write record and result (a dict) to <output_path>.cache.json, via a temporary file
+    so it is never half written.
+    """
+    tmp_path = output_path + ".cache.json.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(dict(record, **result), f)
+    os.replace(tmp_path, output_path + ".cache.json")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Strong and weak scaling benchmark for the pi scripts in this directory.
+Usage: python benchmark-pi.py <output_file> [--mode {strong,weak}] [--points N ...]
+                              [--processes P ...] [--scripts SCRIPT ...] [--repeats R]
+
+Every combination of script, point count and process count is run as a separate
+Python process. Wall time, CPU time (user + system, all processes) and peak RSS
+(largest single process) are recorded in one tidy CSV together with points/sec,
+speedup and parallel efficiency.
+
+- strong scaling: --points is the total number of points; the work is split across
+  more processes, ideally the wall time drops as 1/P.
+- weak scaling: --points is the number of points per process; the total grows with P,
+  ideally the wall time stays constant.
+
+The serial scripts only run with 1 process. Speedup and efficiency are relative to
+the 1-process run of the same script and point count (strong) or points per process (weak).
+"""
+
+import argparse
+import csv
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ("serial-pi.py", "serial-numpy-pi.py", "mp-pi.py")
+# only these scripts take a <num_processes> argument
+PARALLEL_SCRIPTS = ("mp-pi.py",)
+FIELDS = ["mode", "script", "processes", "num_points", "repeat", "wall_seconds",
+          "cpu_seconds", "max_rss_mb", "points_per_sec", "speedup", "efficiency"]
+
+
+def default_processes():
+    """
+    1, 2, 4, ... up to the number of cores Slurm assigned (or the cores of this machine).
+    """
+    max_procs = int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 1))
+    procs = []
+    p = 1
+    while p < max_procs:
+        procs.append(p)
+        p *= 2
+    procs.append(max_procs)
+    return procs
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the pi scripts")
+    parser.add_argument("output_file", help="CSV file to write the measurements to")
+    parser.add_argument("--mode", choices=("strong", "weak"), default="strong",
+                        help="strong: --points is the total; weak: --points is per process")
+    parser.add_argument("--points", type=int, nargs="+", default=[1000000, 10000000],
+                        help="point counts to run (default: 1000000 10000000)")
+    parser.add_argument("--processes", type=int, nargs="+", default=default_processes(),
+                        help="process counts for mp-pi.py (default: 1, 2, 4, ... cores)")
+    parser.add_argument("--scripts", nargs="+", choices=SCRIPTS, default=list(SCRIPTS),
+                        help="scripts to benchmark (default: all)")
+    parser.add_argument("--repeats", type=int, default=1,
+                        help="how often to repeat each run (default: 1)")
+    args = parser.parse_args()
+    if min(args.points) < 1 or min(args.processes) < 1 or args.repeats < 1:
+        parser.error("--points, --processes and --repeats must be at least 1")
+    return args
+
+
+def run_script(script, num_points, processes, output_file):
+    """
+    Run one pi script and return (wall_seconds, cpu_seconds, max_rss_mb).
+    os.wait4 returns the resource usage of the child, including the pool workers it waited for.
+    """
+    cmd = [sys.executable, os.path.join(SCRIPT_DIR, script), str(num_points), output_file]
+    if script in PARALLEL_SCRIPTS:
+        cmd.append(str(processes))
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} exited with status {proc.returncode}")
+    # ru_maxrss is in kilobytes on Linux
+    return wall, usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024
+
+
+def run_benchmark(mode, points, processes, scripts, repeats):
+    """
+    Run every (script, points, processes) combination and return a list of row dicts.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output_file = os.path.join(tmpdir, "pi.csv")
+        for script in scripts:
+            procs = processes if script in PARALLEL_SCRIPTS else [1]
+            for n in points:
+                for p in procs:
+                    num_points = n * p if mode == "weak" else n
+                    for repeat in range(repeats):
+                        logging.info(f"{script}: {num_points} points, {p} processes (repeat {repeat})")
+                        wall, cpu, rss = run_script(script, num_points, p, output_file)
+                        rows.append({"mode": mode, "script": script, "processes": p,
+                                     "num_points": num_points, "repeat": repeat,
+                                     "wall_seconds": wall, "cpu_seconds": cpu,
+                                     "max_rss_mb": rss, "points_per_sec": num_points / wall})
+    return rows
+
+
+def add_scaling(rows, mode):
+    """
+    Add speedup and efficiency columns. The baseline is the mean wall time of the
+    1-process runs of the same script and point count (strong) or per-process count (weak).
+    Without a 1-process run the smallest process count is used as the baseline.
+    """
+    groups = {}
+    for row in rows:
+        n = row["num_points"] // row["processes"] if mode == "weak" else row["num_points"]
+        groups.setdefault((row["script"], n), []).append(row)
+    for group in groups.values():
+        base_procs = min(row["processes"] for row in group)
+        base_walls = [row["wall_seconds"] for row in group if row["processes"] == base_procs]
+        base_wall = sum(base_walls) / len(base_walls)
+        for row in group:
+            ratio = base_wall / row["wall_seconds"]
+            rel_procs = row["processes"] / base_procs
+            if mode == "weak":
+                # the work grows with P, so ideal is a constant wall time
+                row["speedup"] = ratio * rel_procs
+                row["efficiency"] = ratio
+            else:
+                row["speedup"] = ratio
+                row["efficiency"] = ratio / rel_procs
+    return rows
+
+
+def save_results(rows, output_file):
+    """
+    Save the measurements to a CSV file.
+    """
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    """
+    Main function.
+    """
+    args = parse_args()
+    rows = run_benchmark(args.mode, args.points, sorted(set(args.processes)),
+                         args.scripts, args.repeats)
+    add_scaling(rows, args.mode)
+    save_results(rows, args.output_file)
+    logging.info(f"Saved {len(rows)} measurements to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Guard the startup cost of the pi scripts with `python -X importtime`.
+Usage: python benchmark-startup.py [script ...] [--repeats R] [--budget-ms MS]
+                                   [--forbid MODULE ...]
+
+Each script is started with --help, so all module-level imports run but no work is done.
+For every script the best of --repeats runs is reported: the total import time, the wall
+time of the whole interpreter start, and the slowest top-level imports. The exit status
+is 1 if a script goes over the import-time budget or imports a forbidden module
+(by default pandas, which should only be loaded for the rich output formats).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ("serial-pi.py", "serial-numpy-pi.py", "mp-pi.py", "reduce-pi.py")
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Import-time check for the pi scripts")
+    parser.add_argument("scripts", nargs="*", default=list(SCRIPTS),
+                        help="scripts in this directory to check (default: the pi scripts)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="runs per script, the fastest one counts (default: 5)")
+    parser.add_argument("--budget-ms", type=float, default=300.0,
+                        help="maximum total import time per script in ms (default: 300)")
+    parser.add_argument("--forbid", nargs="*", default=["pandas"],
+                        help="modules that must not be imported at startup (default: pandas)")
+    args = parser.parse_args()
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+    return args
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into a list of (module, depth, self_us, cumulative_us).
+    Lines look like "import time:       640 |       2208 |   shutil", where the indentation
+    of the module name (two spaces per level) shows which import triggered it.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2][1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), depth, int(fields[0]), int(fields[1])))
+    return imports
+
+
+def measure(script):
+    """
+    Start one script with -X importtime and return (wall_ms, imports).
+    """
+    cmd = [sys.executable, "-X", "importtime", os.path.join(SCRIPT_DIR, script), "--help"]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    return wall_ms, parse_importtime(result.stderr)
+
+
+def check_script(script, repeats, budget_ms, forbid):
+    """
+    Measure script repeats times; print a summary and return a list of problems.
+    """
+    best = None
+    for _ in range(repeats):
+        wall_ms, imports = measure(script)
+        import_ms = sum(cum for _, depth, _, cum in imports if depth == 0) / 1000
+        if best is None or import_ms < best[1]:
+            best = (wall_ms, import_ms, imports)
+    wall_ms, import_ms, imports = best
+    print(f"{script}: imports {import_ms:.1f} ms, interpreter start {wall_ms:.1f} ms")
+    top_level = sorted((m for m in imports if m[1] == 0), key=lambda m: m[3], reverse=True)
+    for name, _, _, cumulative in top_level[:5]:
+        print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+    problems = []
+    if import_ms > budget_ms:
+        problems.append(f"{script}: imports take {import_ms:.1f} ms, budget is {budget_ms:.0f} ms")
+    loaded = {name.split(".")[0] for name, _, _, _ in imports}
+    for module in forbid:
+        if module in loaded:
+            problems.append(f"{script}: imports {module} at startup")
+    return problems
+
+
+def main():
+    """
+    Main function.
+    """
+    args = parse_args()
+    problems = []
+    for script in args.scripts:
+        problems.extend(check_script(script, args.repeats, args.budget_ms, args.forbid))
+    for problem in problems:
+        print(f"FAIL {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,62 +3,182 @@
 """
 Monte Carlo pi estimation using multiprocessing.
 Usage: python mp-pi.py <num_points> <output_file> <num_processes>
+                        [--target-stderr SE] [--max-seconds S]
+                        [--sampler {random,qmc}] [--compare]
+                        [--checkpoint FILE [--resume] [--checkpoint-interval S]]
+                        [--shard [--task-id T] [--num-tasks N] [--seed S]]
+
+With --sampler qmc the points come from a scrambled Halton sequence (quasi-Monte Carlo);
+each worker generates its own contiguous slice of the sequence by skipping ahead.
+--compare runs both samplers over a ladder of point counts and writes a table of
+error versus wall time.
+With --checkpoint the points are handed out in rounds and the per-round inside counts
+are saved to FILE every --checkpoint-interval seconds and when SIGTERM or SIGUSR1
+arrives (Slurm sends these before killing a job). --resume continues from FILE and
+gives exactly the same result as an uninterrupted run.
+With --shard the run is one of num_tasks tasks (e.g. a Slurm job array) that share
+num_points: this task computes its slice from its own seed stream and writes the
+partial counts to output_file. reduce-pi.py merges the shards into the final result.
 """
 
-import random
+import argparse
 import logging
+import json
+import os
+import signal
 import sys
-import pandas as pd
-from multiprocessing import Pool
+import time
+import numpy as np
+from multiprocessing import Pool, TimeoutError
+
+from pi_io import save_result, save_rows
+from pi_qmc import SAMPLERS, compare_samplers, count_inside_qmc, save_comparison
+from pi_stats import MIN_POINTS, binomial_stderr, precise_enough
 
 logging.basicConfig(level=logging.INFO)
 
+# points drawn per block inside each worker; keeps per-worker memory at a few MB
+BLOCK_SIZE = 2**18
+# points per task handed out to the pool in adaptive mode
+ROUND_SIZE = 2**22
+
 
 def parse_args():
     """
     Parse command line arguments.
     """
-    try:
-        num_points = int(sys.argv[1])
-        output_file = sys.argv[2]
-        num_processes = int(sys.argv[3])
-    except ValueError:
-        logging.error("Error: num_points and num_processes must be integers")
-        sys.exit(1)
-    except IndexError:
-        logging.error("Usage: python %s <num_points> <output_file> <num_processes>",
-                      sys.argv[0])
-        sys.exit(1)
-    if num_processes < 1:
-        logging.error("Error: num_processes must be at least 1")
-        sys.exit(1)
-    return num_points, output_file, num_processes
+    parser = argparse.ArgumentParser(description="Monte Carlo pi estimation using multiprocessing")
+    parser.add_argument("num_points", type=int,
+                        help="number of random points (upper bound in adaptive mode)")
+    parser.add_argument("output_file", help="CSV file to write the result to")
+    parser.add_argument("num_processes", type=int, help="number of worker processes")
+    parser.add_argument("--target-stderr", type=float, default=None,
+                        help="stop once the standard error of pi drops below this value "
+                             f"(checked after at least {MIN_POINTS} points)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="stop after this many seconds of sampling")
+    parser.add_argument("--sampler", choices=SAMPLERS, default="random",
+                        help="pseudo-random points or scrambled Halton points (default: random)")
+    parser.add_argument("--compare", action="store_true",
+                        help="write an error vs. wall time table for both samplers instead")
+    parser.add_argument("--checkpoint", default=None, metavar="FILE",
+                        help="save progress to this JSON state file")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the --checkpoint file if it exists")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0,
+                        help="seconds between checkpoints (default: 60)")
+    parser.add_argument("--shard", action="store_true",
+                        help="compute one task's share of num_points and write a partial-result shard")
+    parser.add_argument("--task-id", type=int, default=None,
+                        help="index of this task, 0 .. num_tasks-1 (default: from SLURM_ARRAY_TASK_ID)")
+    parser.add_argument("--num-tasks", type=int, default=None,
+                        help="number of tasks (default: SLURM_ARRAY_TASK_COUNT)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed shared by all tasks (default: SLURM_ARRAY_JOB_ID)")
+    args = parser.parse_args()
+    if args.num_points < 1:
+        parser.error("num_points must be at least 1")
+    if args.num_processes < 1:
+        parser.error("num_processes must be at least 1")
+    adaptive = args.target_stderr is not None or args.max_seconds is not None
+    if adaptive and (args.sampler == "qmc" or args.compare):
+        # the binomial standard error only holds for independent random points
+        parser.error("--target-stderr/--max-seconds require --sampler random")
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+    if args.checkpoint is not None and (adaptive or args.compare or args.sampler == "qmc"):
+        # a fixed set of rounds is what makes a resumed run reproducible
+        parser.error("--checkpoint only works with a fixed number of points and --sampler random")
+    if args.shard:
+        if adaptive or args.compare or args.checkpoint is not None:
+            parser.error("--shard cannot be combined with adaptive, --compare or --checkpoint modes")
+        args.task_id, args.num_tasks, args.seed = shard_settings(args.task_id, args.num_tasks, args.seed)
+        if args.task_id is None or args.num_tasks is None or args.seed is None:
+            parser.error("--shard needs --task-id, --num-tasks and --seed (or a Slurm job array)")
+        if not 0 <= args.task_id < args.num_tasks:
+            parser.error("--task-id must be between 0 and --num-tasks - 1")
+    return args
+
+
+def shard_settings(task_id, num_tasks, seed):
+    """
+    Fill in task id, task count and shared seed from the Slurm job array environment
+    where they were not given on the command line. Array indices may start at any
+    value (e.g. --array=1-5), so the task id is counted from SLURM_ARRAY_TASK_MIN.
+    """
+    env = os.environ
+    if task_id is None and "SLURM_ARRAY_TASK_ID" in env:
+        task_id = int(env["SLURM_ARRAY_TASK_ID"]) - int(env.get("SLURM_ARRAY_TASK_MIN", 0))
+    if num_tasks is None and "SLURM_ARRAY_TASK_COUNT" in env:
+        num_tasks = int(env["SLURM_ARRAY_TASK_COUNT"])
+    if seed is None and "SLURM_ARRAY_JOB_ID" in env:
+        seed = int(env["SLURM_ARRAY_JOB_ID"])
+    return task_id, num_tasks, seed
+
+
+def worker_rng(base_seed, worker_id):
+    """
+    Return an independent random number generator for worker_id.
+    SeedSequence(base_seed).spawn(n)[worker_id] has spawn_key (worker_id,); building
+    it directly gives the same stream without spawning all n children in every worker.
+    Spawned streams are statistically independent, unlike seeding with base_seed + worker_id.
+    """
+    seed_seq = np.random.SeedSequence(base_seed, spawn_key=(worker_id,))
+    return np.random.default_rng(seed_seq)
 
 
 def count_inside(args):
     """
     Worker: generate n_points random (x,y) and return how many fall inside unit circle.
     args = (n_points, base_seed, worker_id) so each worker has distinct RNG state.
+    Points are drawn in blocks of BLOCK_SIZE with NumPy instead of one at a time.
     """
     n_points, base_seed, worker_id = args
-    random.seed(base_seed + worker_id)
+    rng = worker_rng(base_seed, worker_id)
+    block_size = max(1, min(BLOCK_SIZE, n_points))
+    x = np.empty(block_size)
+    y = np.empty(block_size)
     num_inside = 0
-    for _ in range(n_points):
-        x = random.random()
-        y = random.random()
-        if x * x + y * y <= 1.0:
-            num_inside += 1
+    remaining = n_points
+    while remaining > 0:
+        n = min(block_size, remaining)
+        xb, yb = x[:n], y[:n]
+        rng.random(out=xb)
+        rng.random(out=yb)
+        np.multiply(xb, xb, out=xb)
+        np.multiply(yb, yb, out=yb)
+        np.add(xb, yb, out=xb)
+        num_inside += int(np.count_nonzero(xb <= 1.0))
+        remaining -= n
     logging.info(f"Worker {worker_id}: {num_inside} points of {n_points} points inside are within the unit circle")
     return num_inside
 
 
-def calculate_pi(num_points, num_processes):
+def count_inside_qmc_worker(args):
     """
-    Distribute num_points across num_processes workers; sum inside counts and compute pi.
+    Worker: count how many scrambled Halton points with indices start .. start+n_points-1
+    fall inside the unit circle. args = (n_points, base_seed, start); base_seed selects the
+    scrambling, start skips ahead to this worker's slice of the sequence.
+    """
+    n_points, base_seed, start = args
+    num_inside = count_inside_qmc(base_seed, start, n_points, BLOCK_SIZE)
+    logging.info(f"Worker at index {start}: {num_inside} points of {n_points} points inside are within the unit circle")
+    return num_inside
+
+
+def count_round(args):
+    """
+    Worker for round-based modes: like count_inside, but also returns the chunk itself
+    so that results can be matched up when they arrive out of order.
+    """
+    return args, count_inside(args)
+
+
+def count_inside_pool(num_points, num_processes, sampler, base_seed, start=0):
+    """
+    Distribute num_points across num_processes workers and return the summed inside count.
+    For the qmc sampler, start is the index of the first point of the sequence to use.
     """
-    logging.info(f"Calculating pi using {num_points} points and {num_processes} processes")
-    master = random.Random()
-    base_seed = master.randint(0, 2**32 - 1)
     # distribute the numpoints across the workers
     chunk_size = num_points // num_processes
     remainder = num_points % num_processes
@@ -66,30 +186,238 @@ def calculate_pi(num_points, num_processes):
     for i in range(num_processes):
         n = chunk_size + (1 if i < remainder else 0)
         if n > 0:
-            chunks.append((n, base_seed, i))
+            # random: the worker id picks the RNG stream; qmc: the start index of the slice
+            chunks.append((n, base_seed, start if sampler == "qmc" else i))
+        start += n
     logging.info(f"Chunks: {chunks}")
+    worker = count_inside_qmc_worker if sampler == "qmc" else count_inside
 
-    # create a pool of workers and map the count_inside function to the chunks
+    # create a pool of workers and map the worker function to the chunks
     # counts is a list of results returned by each worker
     with Pool(processes=num_processes) as pool:
-        counts = pool.map(count_inside, chunks)
-    
+        counts = pool.map(worker, chunks)
+
     # aggregate the results
-    total_inside = sum(counts)
+    return sum(counts)
+
+
+def calculate_pi(num_points, num_processes, sampler="random"):
+    """
+    Distribute num_points across num_processes workers; sum inside counts and compute pi.
+    """
+    logging.info(f"Calculating pi using {num_points} points and {num_processes} processes ({sampler} sampler)")
+    base_seed = np.random.SeedSequence().entropy
+    total_inside = count_inside_pool(num_points, num_processes, sampler, base_seed)
     return 4.0 * total_inside / num_points
 
 
-def save_result(pi, num_points, output_file):
-    df = pd.DataFrame({"pi": [pi], "num_points": [num_points]})
-    df.to_csv(output_file, index=False)
+def calculate_shard(num_points, num_processes, sampler, seed, task_id, num_tasks):
+    """
+    Compute task task_id's share of num_points split over num_tasks tasks.
+    Random sampler: the task's workers draw from SeedSequence(seed) child task_id, so
+    every task (and every worker inside it) has an independent stream.
+    QMC sampler: all tasks share the scrambling from seed and take consecutive slices
+    of the sequence. Returns (num_inside, task_points).
+    """
+    chunk_size, remainder = divmod(num_points, num_tasks)
+    task_points = chunk_size + (1 if task_id < remainder else 0)
+    task_start = task_id * chunk_size + min(task_id, remainder)
+    logging.info(f"Task {task_id} of {num_tasks}: {task_points} of {num_points} points "
+                 f"with {num_processes} processes ({sampler} sampler)")
+    if task_points == 0:
+        return 0, 0
+    if sampler == "qmc":
+        base_seed = seed
+    else:
+        task_seq = np.random.SeedSequence(seed, spawn_key=(task_id,))
+        base_seed = int.from_bytes(task_seq.generate_state(4).tobytes(), "little")
+    num_inside = count_inside_pool(task_points, num_processes, sampler, base_seed, task_start)
+    return num_inside, task_points
+
+
+def round_chunks(max_points, base_seed):
+    """
+    Yield (n_points, base_seed, task_id) chunks of ROUND_SIZE points until max_points
+    are handed out. The task id selects the SeedSequence child stream, so every round
+    draws from its own independent stream.
+    """
+    task_id = 0
+    handed_out = 0
+    while handed_out < max_points:
+        n = min(ROUND_SIZE, max_points - handed_out)
+        yield (n, base_seed, task_id)
+        handed_out += n
+        task_id += 1
+
+
+def calculate_pi_adaptive(max_points, num_processes, target_stderr=None, max_seconds=None):
+    """
+    Hand out rounds of ROUND_SIZE points to the pool and fold the results in as they
+    arrive; stop as soon as the standard error drops below target_stderr (after at least
+    MIN_POINTS points), max_seconds have passed, or max_points are used up. Rounds still
+    running are discarded.
+    Returns (pi, num_points, stderr).
+    """
+    logging.info(f"Calculating pi using up to {max_points} points and {num_processes} processes "
+                 f"(target stderr {target_stderr}, max seconds {max_seconds})")
+    base_seed = np.random.SeedSequence().entropy
+    start = time.perf_counter()
+    num_inside = 0
+    num_points = 0
+    with Pool(processes=num_processes) as pool:
+        for chunk, inside in pool.imap_unordered(count_round, round_chunks(max_points, base_seed)):
+            num_inside += inside
+            num_points += chunk[0]
+            if precise_enough(num_inside, num_points, target_stderr):
+                break
+            if max_seconds is not None and time.perf_counter() - start >= max_seconds:
+                break
+    # leaving the with block terminates the pool, cancelling the remaining rounds
+    pi = 4.0 * num_inside / num_points
+    return pi, num_points, binomial_stderr(num_inside, num_points)
+
+
+# name of the signal that asked the checkpointed run to stop, set by request_stop
+stop_signal = None
+
+
+def request_stop(signum, frame):
+    """
+    Signal handler: only record the signal. Raising from a handler could interrupt the
+    pool in the middle of its bookkeeping, so the main loop polls the flag instead.
+    """
+    global stop_signal
+    stop_signal = signal.Signals(signum).name
+
+
+def reset_stop_signals():
+    """
+    Pool initializer: workers inherit request_stop from the main process. Put SIGTERM
+    back to the default so that Pool.terminate() (and Slurm) can still kill them, and
+    ignore SIGUSR1, which is meant for the main process only.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+
+def load_checkpoint(checkpoint_file):
+    """
+    Load a state file written by save_checkpoint.
+    """
+    with open(checkpoint_file) as f:
+        state = json.load(f)
+    # JSON object keys are strings
+    state["completed"] = {int(task_id): inside for task_id, inside in state["completed"].items()}
+    return state
+
+
+def save_checkpoint(state, checkpoint_file):
+    """
+    Write the state file atomically, so a kill during the write leaves the previous one intact.
+    """
+    tmp_file = checkpoint_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def calculate_pi_checkpointed(num_points, num_processes, checkpoint_file, resume=False,
+                              interval=60.0):
+    """
+    Like calculate_pi, but the points are handed out in rounds of ROUND_SIZE and the
+    inside count of every finished round is checkpointed to checkpoint_file.
+
+    The state file holds the base seed and the inside count per round. A round's random
+    stream is fully determined by (base_seed, task_id), so unfinished rounds are simply
+    recomputed from the start on resume and the final result is bit-for-bit identical
+    to an uninterrupted run.
+    """
+    state = None
+    if resume and os.path.exists(checkpoint_file):
+        state = load_checkpoint(checkpoint_file)
+        if state["num_points"] != num_points or state["round_size"] != ROUND_SIZE:
+            logging.error(f"Error: {checkpoint_file} was written for {state['num_points']} points "
+                          f"in rounds of {state['round_size']}")
+            sys.exit(1)
+        logging.info(f"Resuming from {checkpoint_file}: {len(state['completed'])} rounds done")
+    elif resume:
+        logging.info(f"No checkpoint {checkpoint_file} found, starting from scratch")
+    if state is None:
+        state = {"num_points": num_points, "round_size": ROUND_SIZE,
+                 "base_seed": np.random.SeedSequence().entropy, "completed": {}}
+    completed = state["completed"]
+    todo = [chunk for chunk in round_chunks(num_points, state["base_seed"])
+            if chunk[2] not in completed]
+    logging.info(f"Calculating pi using {num_points} points and {num_processes} processes "
+                 f"({len(todo)} rounds to go, checkpointing to {checkpoint_file})")
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGUSR1, request_stop)
+    last_save = time.perf_counter()
+    with Pool(processes=num_processes, initializer=reset_stop_signals) as pool:
+        results = pool.imap_unordered(count_round, todo)
+        remaining = len(todo)
+        while remaining > 0 and stop_signal is None:
+            try:
+                # wake up every second to check for a stop signal
+                chunk, inside = results.next(timeout=1.0)
+            except TimeoutError:
+                continue
+            completed[chunk[2]] = inside
+            remaining -= 1
+            if time.perf_counter() - last_save >= interval:
+                save_checkpoint(state, checkpoint_file)
+                last_save = time.perf_counter()
+    # leaving the with block terminates the workers, including unfinished rounds
+    save_checkpoint(state, checkpoint_file)
+    if stop_signal is not None:
+        logging.warning(f"Stopped by {stop_signal}; saved {len(completed)} finished rounds to {checkpoint_file}")
+        sys.exit(1)
+
+    total_inside = sum(completed.values())
+    return 4.0 * total_inside / num_points
+
+
+def save_shard(task_id, num_tasks, seed, total_points, num_inside, num_points, output_file):
+    """
+    Save one task's partial counts; total_points is the num_points of the whole run,
+    so that reduce-pi.py can check that the shards add up to it.
+    """
+    row = {"task_id": task_id, "num_tasks": num_tasks, "seed": seed, "total_points": total_points,
+           "num_inside": num_inside, "num_points": num_points}
+    save_rows([row], list(row), output_file)
 
 
 def main():
-    num_points, output_file, num_processes = parse_args()
-    pi = calculate_pi(num_points, num_processes)
-    save_result(pi, num_points, output_file)
+    args = parse_args()
+    num_points = args.num_points
+    if args.compare:
+        rows = compare_samplers(lambda n, sampler: calculate_pi(n, args.num_processes, sampler),
+                                num_points)
+        save_comparison(rows, args.output_file)
+        logging.info(f"Saved sampler comparison to {args.output_file}")
+        return
+    if args.shard:
+        num_inside, task_points = calculate_shard(num_points, args.num_processes, args.sampler,
+                                                  args.seed, args.task_id, args.num_tasks)
+        save_shard(args.task_id, args.num_tasks, args.seed, num_points, num_inside, task_points,
+                   args.output_file)
+        logging.info(f"Saved shard {args.task_id}: {num_inside} of {task_points} points inside, "
+                     f"to {args.output_file}")
+        return
+    if args.checkpoint is not None:
+        pi = calculate_pi_checkpointed(num_points, args.num_processes, args.checkpoint,
+                                       args.resume, args.checkpoint_interval)
+    elif args.target_stderr is None and args.max_seconds is None:
+        pi = calculate_pi(num_points, args.num_processes, args.sampler)
+    else:
+        pi, num_points, stderr = calculate_pi_adaptive(num_points, args.num_processes,
+                                                       args.target_stderr, args.max_seconds)
+        logging.info(f"Used {num_points} points, stderr {stderr:.3g}, "
+                     f"95% CI [{pi - 1.96 * stderr:.6f}, {pi + 1.96 * stderr:.6f}]")
+    save_result(pi, num_points, args.output_file)
     logging.info(f"Pi: {pi}")
-    logging.info(f"Saved result to {output_file}")
+    logging.info(f"Saved result to {args.output_file}")
 
 
 if __name__ == "__main__":
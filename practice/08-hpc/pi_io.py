@@ -0,0 +1,42 @@
+"""
+Output helpers shared by the pi scripts in this folder (serial-pi.py, serial-numpy-pi.py,
+mp-pi.py and reduce-pi.py).
+
+Results are written with the csv module. pandas is only imported for the formats in
+RICH_FORMATS (chosen by file extension), because importing it adds several hundred
+milliseconds to the startup of every job.
+"""
+
+import csv
+import os
+
+# output formats that need pandas, by file extension; anything else is written as CSV
+RICH_FORMATS = (".json", ".parquet", ".xlsx")
+
+
+def save_rows(rows, fieldnames, output_file):
+    """
+    Write rows (a list of dicts) to output_file.
+    """
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension in RICH_FORMATS:
+        import pandas as pd
+        df = pd.DataFrame(rows, columns=fieldnames)
+        if extension == ".json":
+            df.to_json(output_file, orient="records")
+        elif extension == ".parquet":
+            df.to_parquet(output_file, index=False)
+        else:
+            df.to_excel(output_file, index=False)
+        return
+    with open(output_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def save_result(pi, num_points, output_file):
+    """
+    Save a pi estimate and the number of points it used.
+    """
+    save_rows([{"pi": pi, "num_points": num_points}], ["pi", "num_points"], output_file)
@@ -0,0 +1,144 @@
+"""
+Scrambled Halton (quasi-Monte Carlo) sampler and the sampler comparison table, shared by
+serial-numpy-pi.py and mp-pi.py.
+"""
+
+import functools
+import math
+import time
+
+import numpy as np
+
+from pi_io import save_rows
+
+# points generated per block; two float64 and two int64 buffers of 2 MB each
+BLOCK_SIZE = 2**18
+
+# Halton bases for the x and y coordinates
+HALTON_BASES = (2, 3)
+SAMPLERS = ("random", "qmc")
+
+
+@functools.lru_cache(maxsize=1)
+def halton_scramblers(seed):
+    """
+    Random digit permutations for a scrambled Halton sequence, one set per coordinate.
+    The same seed always gives the same scrambling, so all parts of a run share one point set;
+    the result is cached so each worker process or thread builds the tables only once.
+
+    For speed, the low digits of an index are handled with a lookup table of the scrambled
+    values of 0 .. base**low_digits - 1, and only the few distinct high parts in a block
+    are computed digit by digit.
+    """
+    rng = np.random.default_rng(seed)
+    scramblers = []
+    for base in HALTON_BASES:
+        # beyond this many digits the value no longer changes a float64
+        num_digits = math.ceil(53 / math.log2(base))
+        perms = np.array([rng.permutation(base) for _ in range(num_digits)])
+        weights = float(base) ** -np.arange(1, num_digits + 1)
+        # digit_values[d][k]: value of digit k at position d after scrambling
+        digit_values = perms * weights[:, None]
+        # tail[d]: value of positions d, d+1, ... when all remaining digits are zero
+        tail = np.append(np.cumsum(digit_values[::-1, 0])[::-1], 0.0)
+        # about 2**18 table entries per coordinate
+        low_digits = int(18 / math.log2(base))
+        low_table = np.zeros(base**low_digits)
+        low = np.arange(base**low_digits)
+        for d in range(low_digits):
+            low, digit = np.divmod(low, base)
+            low_table += digit_values[d][digit]
+        scramblers.append({"base": base, "digit_values": digit_values, "tail": tail,
+                           "low_digits": low_digits, "low_table": low_table})
+    return scramblers
+
+
+def scrambled_high_part(high, scrambler):
+    """
+    Scrambled value of the digits of an index above the low digits (high = index // table size).
+    """
+    base = scrambler["base"]
+    digit_values = scrambler["digit_values"]
+    d = scrambler["low_digits"]
+    value = 0.0
+    while high and d < len(digit_values):
+        high, k = divmod(high, base)
+        value += digit_values[d][k]
+        d += 1
+    return value + scrambler["tail"][d]
+
+
+def scrambled_halton(start, scrambler, out, high, low):
+    """
+    Write the scrambled radical inverse of the indices start, start+1, ... into out:
+    the base-b digits of each index are permuted and mirrored around the radix point.
+    high and low are int64 scratch buffers of the same length as out.
+    """
+    low_table = scrambler["low_table"]
+    n = len(out)
+    np.add(np.arange(n, dtype=np.int64), start, out=low)
+    np.divmod(low, len(low_table), out=(high, low))
+    first = start // len(low_table)
+    last = (start + n - 1) // len(low_table)
+    high_values = np.array([scrambled_high_part(h, scrambler) for h in range(first, last + 1)])
+    np.subtract(high, first, out=high)
+    np.take(low_table, low, out=out)
+    out += high_values[high]
+
+
+def count_inside_qmc(seed, start, num_points, block_size=BLOCK_SIZE):
+    """
+    Count how many of the scrambled Halton points with indices start .. start+num_points-1
+    fall inside the unit circle, generating them in blocks of block_size. seed selects
+    the scrambling. Any slice of the sequence can be generated directly (skip-ahead),
+    so the index range can be split across workers.
+    """
+    scramblers = halton_scramblers(seed)
+    block_size = max(1, min(block_size, num_points))
+    high = np.empty(block_size, dtype=np.int64)
+    low = np.empty(block_size, dtype=np.int64)
+    x = np.empty(block_size)
+    y = np.empty(block_size)
+    num_inside = 0
+    done = 0
+    while done < num_points:
+        n = min(block_size, num_points - done)
+        xb, yb = x[:n], y[:n]
+        scrambled_halton(start + done, scramblers[0], xb, high[:n], low[:n])
+        scrambled_halton(start + done, scramblers[1], yb, high[:n], low[:n])
+        np.multiply(xb, xb, out=xb)
+        np.multiply(yb, yb, out=yb)
+        np.add(xb, yb, out=xb)
+        num_inside += int(np.count_nonzero(xb <= 1.0))
+        done += n
+    return num_inside
+
+
+def compare_samplers(calculate_pi, max_points):
+    """
+    Run both samplers for 1000, 10000, ... points up to max_points and record the
+    absolute error and wall time of each run. calculate_pi(num_points, sampler)
+    returns one estimate. Returns a list of row dicts.
+    """
+    ladder = []
+    n = 1000
+    while n < max_points:
+        ladder.append(n)
+        n *= 10
+    ladder.append(max_points)
+    rows = []
+    for num_points in ladder:
+        for sampler in SAMPLERS:
+            start = time.perf_counter()
+            pi = calculate_pi(num_points, sampler)
+            seconds = time.perf_counter() - start
+            rows.append({"sampler": sampler, "num_points": num_points, "pi": pi,
+                         "abs_error": abs(pi - math.pi), "seconds": seconds})
+    return rows
+
+
+def save_comparison(rows, output_file):
+    """
+    Save the sampler comparison table.
+    """
+    save_rows(rows, ["sampler", "num_points", "pi", "abs_error", "seconds"], output_file)
@@ -0,0 +1,28 @@
+"""
+Precision of a Monte Carlo pi estimate, shared by the adaptive modes of serial-pi.py,
+serial-numpy-pi.py and mp-pi.py.
+"""
+
+import math
+
+# adaptive runs never stop on the standard error before this many points
+MIN_POINTS = 1000
+
+
+def binomial_stderr(num_inside, num_points):
+    """
+    Standard error of the pi estimate 4 * num_inside / num_points.
+    Each point is a Bernoulli trial with p = pi/4, so se(pi) = 4 * sqrt(p(1-p)/n).
+    p is estimated as (num_inside+1)/(num_points+2), so a run where all or none of the
+    first points fell inside does not get a standard error of 0.
+    """
+    p = (num_inside + 1) / (num_points + 2)
+    return 4 * math.sqrt(p * (1 - p) / num_points)
+
+
+def precise_enough(num_inside, num_points, target_stderr):
+    """
+    True once at least MIN_POINTS points were drawn and the standard error is at most target_stderr.
+    """
+    return (target_stderr is not None and num_points >= MIN_POINTS
+            and binomial_stderr(num_inside, num_points) <= target_stderr)
@@ -2,19 +2,181 @@
 
 """
 Process a text file and count the number of words.
-Usage: python process-text.py <input_file> <output_file>
+Usage: python process-text.py <input_file> <output_file> [--engine {mmap,split}] [--processes P]
+       python process-text.py (--manifest FILE | --glob PATTERN) --output-dir DIR
+                              [--task-id I] [--num-tasks N] [--processes P]
+
+A word is what text.split() returns: a maximal run of non-whitespace characters.
+- split: read the whole file into a string and count text.split() (simple, but needs
+         memory for the text and a list of every word).
+- mmap:  (default) get the same count without decoding the UTF-8 file or building any
+         strings. The file is memory-mapped one window at a time and NumPy counts the
+         places where a whitespace byte is followed by a non-whitespace byte. With
+         --processes the file is split at byte offsets and each process counts the
+         words that start in its part, so a word straddling two parts is counted once.
+
+Batch mode processes many files in one run, so a job array does not pay for starting
+Python once per file: the inputs come from a manifest (one path per line) or a glob
+pattern, task I of N takes every N-th file starting at the I-th, a pool of --processes
+workers counts them, and each file's result goes to <output-dir>/results-<name>.txt.
+The task id and count default to the Slurm job array (SLURM_ARRAY_TASK_ID etc.).
+
+With --incremental, a result is only recomputed if its input changed: next to each
+output file, <output_file>.cache.json records the input's path, a BLAKE2 hash of its
+content and the parameters that determine the result; when all of them match and the
+output file is still there, the output is reused as it is.
 """
 
+import argparse
+import functools
+import mmap
+import os
 import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+from batch_inputs import (batch_outputs, cache_record, cached_result, list_inputs,
+                          save_cache_record, task_settings)
+
+# bytes mapped and scanned at a time; a few times this is the memory the scan needs
+WINDOW_SIZE = 2**22
+# longest UTF-8 encoding of a whitespace character (e.g. U+3000 is 3 bytes)
+MAX_CHAR_BYTES = 3
+# bump when the result for an unchanged input changes, so --incremental recomputes it
+RESULT_VERSION = 1
+
 
 def parse_args():
-    try:
-        input_file = sys.argv[1]
-        output_file = sys.argv[2]
-    except IndexError:
-        print("Usage: python process-text.py <input_file> <output_file>")
-        sys.exit(1)
-    return input_file, output_file
+    parser = argparse.ArgumentParser(description="Count the words in a text file")
+    parser.add_argument("input_file", nargs="?")
+    parser.add_argument("output_file", nargs="?")
+    parser.add_argument("--engine", choices=("mmap", "split"), default="mmap",
+                        help="how to count the words (default: mmap)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="processes for the mmap engine (default: 1)")
+    parser.add_argument("--window-size", type=int, default=WINDOW_SIZE,
+                        help=f"bytes scanned at a time by the mmap engine (default: {WINDOW_SIZE})")
+    inputs = parser.add_mutually_exclusive_group()
+    inputs.add_argument("--manifest", default=None, metavar="FILE",
+                        help="batch mode: file listing one input path per line")
+    inputs.add_argument("--glob", default=None, metavar="PATTERN",
+                        help="batch mode: input files matching PATTERN (quote it)")
+    parser.add_argument("--output-dir", default=None, metavar="DIR",
+                        help="batch mode: directory for the per-file results")
+    parser.add_argument("--task-id", type=int, default=None,
+                        help="batch mode: this task's index, 0 .. num_tasks-1 (default: from Slurm)")
+    parser.add_argument("--num-tasks", type=int, default=None,
+                        help="batch mode: number of tasks sharing the inputs (default: from Slurm)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse the existing output if the input's content has not changed")
+    args = parser.parse_args()
+    if args.processes < 1 or args.window_size < 1:
+        parser.error("--processes and --window-size must be at least 1")
+    batch = args.manifest is not None or args.glob is not None
+    if batch and (args.input_file is not None or args.output_dir is None):
+        parser.error("batch mode takes --output-dir instead of input_file and output_file")
+    if not batch and (args.input_file is None or args.output_file is None or args.output_dir is not None):
+        parser.error("input_file and output_file are required (or use --manifest/--glob with --output-dir)")
+    return args
+
+
+@functools.lru_cache(maxsize=None)
+def whitespace_tables():
+    """
+    The characters str.split() splits on (str.isspace), as UTF-8 bytes.
+    Returns (ranges, multi): ranges lists the (first, last) byte values of the runs of
+    one-byte whitespace characters, and multi maps the leading bytes of every longer
+    whitespace character to a table of the final bytes that complete it.
+    """
+    single = []
+    multi = {}
+    # no code point above the Basic Multilingual Plane is whitespace
+    for code_point in range(0x10000):
+        if chr(code_point).isspace():
+            encoded = chr(code_point).encode("utf-8")
+            if len(encoded) == 1:
+                single.append(encoded[0])
+            else:
+                last = multi.setdefault(encoded[:-1], np.zeros(256, dtype=bool))
+                last[encoded[-1]] = True
+    ranges = []
+    for byte in single:
+        if ranges and ranges[-1][1] == byte - 1:
+            ranges[-1] = (ranges[-1][0], byte)
+        else:
+            ranges.append((byte, byte))
+    return ranges, multi
+
+
+def whitespace_mask(data, ranges, multi):
+    """
+    Boolean array with True for every byte of data that is part of a whitespace character.
+    """
+    # range checks are several times faster than a table lookup per byte; the uint8
+    # subtraction wraps around, so (data - first) <= last - first means first <= data <= last
+    mask = np.zeros(len(data), dtype=bool)
+    for first, last in ranges:
+        mask |= (data - np.uint8(first)) <= last - first
+    # multi-byte whitespace starts with a byte >= 0xC2; skip the search in ASCII text
+    if len(data) and data.max() >= 0xC2:
+        for prefix, last in multi.items():
+            length = len(prefix) + 1
+            n = len(data) - length + 1
+            if n <= 0:
+                continue
+            # positions of the first byte (rare), then narrowed down byte by byte
+            starts = np.flatnonzero(data[:n] == prefix[0])
+            for i, byte in enumerate(prefix[1:], start=1):
+                starts = starts[data[starts + i] == byte]
+            starts = starts[last[data[starts + length - 1]]]
+            for i in range(length):
+                mask[starts + i] = True
+    return mask
+
+
+def count_range(args):
+    """
+    Worker: count the words that start in bytes start .. stop-1 of a file.
+    args = (input_file, start, stop, window_size). A word starts at byte i if byte i is
+    not whitespace and byte i-1 is (or i is 0). Each window is mapped together with the
+    MAX_CHAR_BYTES bytes before it and MAX_CHAR_BYTES-1 after it, enough to tell whether
+    the bytes at its edges belong to a multi-byte whitespace character.
+    """
+    input_file, start, stop, window_size = args
+    ranges, multi = whitespace_tables()
+    num_words = 0
+    with open(input_file, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        for window_start in range(start, stop, window_size):
+            window_stop = min(window_start + window_size, stop)
+            lo = max(window_start - MAX_CHAR_BYTES, 0)
+            hi = min(window_stop + MAX_CHAR_BYTES - 1, size)
+            # mmap offsets must be multiples of the allocation granularity
+            offset = lo - lo % mmap.ALLOCATIONGRANULARITY
+            with mmap.mmap(f.fileno(), hi - offset, access=mmap.ACCESS_READ, offset=offset) as mm:
+                data = np.frombuffer(mm, dtype=np.uint8)[lo - offset:]
+                mask = whitespace_mask(data, ranges, multi)
+                del data
+            if window_start == 0:
+                # the file behaves as if it started with whitespace
+                mask = np.concatenate(([True], mask))
+                lo = -1
+            # whitespace flags of bytes window_start-1 .. window_stop-1
+            flags = mask[window_start - 1 - lo:window_stop - lo]
+            num_words += int(np.count_nonzero(flags[:-1] & ~flags[1:]))
+    return num_words
+
+
+def count_words_mmap(input_file, processes=1, window_size=WINDOW_SIZE):
+    size = os.path.getsize(input_file)
+    bounds = [size * i // processes for i in range(processes + 1)]
+    tasks = [(input_file, a, b, window_size) for a, b in zip(bounds, bounds[1:]) if b > a]
+    if processes == 1 or len(tasks) < 2:
+        return sum(count_range(task) for task in tasks)
+    with Pool(processes=processes) as pool:
+        return sum(pool.map(count_range, tasks))
+
 
 def process_file(input_file, output_file):
     with open(input_file, 'r') as f:
@@ -22,17 +184,89 @@ def process_file(input_file, output_file):
     words = text.split()
     return len(words)
 
+
 def save_result(input_file, num_words, output_file):
     with open(output_file, 'w') as f:
         f.write(f"Input file: {input_file}\n")
         f.write(f"Number of words: {num_words}\n")
 
-def main():
-    input_file, output_file = parse_args()
-    print(f"Processing {input_file}")
-    num_words = process_file(input_file, output_file)
+
+def count_file(input_file, output_file, engine, processes, window_size, incremental):
+    """
+    Count the words of input_file and save the result to output_file.
+    With incremental, reuse the output if the input has not changed.
+    Returns (number of words, whether the output was reused).
+    """
+    if incremental:
+        record = cache_record(input_file, {"result_version": RESULT_VERSION, "engine": engine})
+        cached = cached_result(record, output_file, ("num_words",))
+        if cached is not None:
+            return cached[0], True
+    if engine == "split":
+        num_words = process_file(input_file, output_file)
+    else:
+        num_words = count_words_mmap(input_file, processes, window_size)
     save_result(input_file, num_words, output_file)
-    print(f"Saved result to {output_file}")
+    if incremental:
+        save_cache_record(record, {"num_words": num_words}, output_file)
+    return num_words, False
+
+
+def process_one(args):
+    """
+    Worker: count the words of one file and save the result.
+    args = (input_file, output_file, engine, window_size, incremental). Returns
+    (input_file, number of words or None, error message or None, whether reused).
+    """
+    input_file, output_file, engine, window_size, incremental = args
+    try:
+        num_words, reused = count_file(input_file, output_file, engine, 1, window_size, incremental)
+    except (OSError, UnicodeDecodeError) as e:
+        return input_file, None, str(e), False
+    return input_file, num_words, None, reused
+
+
+def process_batch(args):
+    task_id, num_tasks = task_settings(args.task_id, args.num_tasks)
+    if not 0 <= task_id < num_tasks:
+        print(f"Error: task id {task_id} is not in 0 .. {num_tasks - 1}", file=sys.stderr)
+        sys.exit(1)
+    input_files = list_inputs(args.manifest, args.glob)
+    # strided slice: task i gets files i, i + n, i + 2n, ...
+    pairs = batch_outputs(input_files, args.output_dir, "txt")[task_id::num_tasks]
+    print(f"Task {task_id} of {num_tasks}: processing {len(pairs)} of {len(input_files)} files")
+    os.makedirs(args.output_dir, exist_ok=True)
+    tasks = [(input_file, output_file, args.engine, args.window_size, args.incremental)
+             for input_file, output_file in pairs]
+    failed = 0
+    reused = 0
+    with Pool(processes=args.processes) as pool:
+        for input_file, num_words, error, unchanged in pool.imap_unordered(process_one, tasks, chunksize=16):
+            if error is not None:
+                print(f"Error: {input_file}: {error}", file=sys.stderr)
+                failed += 1
+            reused += unchanged
+    print(f"Saved {len(pairs) - failed} results to {args.output_dir}")
+    if args.incremental:
+        print(f"Reused {reused} results of unchanged inputs, computed {len(pairs) - failed - reused}")
+    if failed:
+        print(f"Error: {failed} files failed", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    args = parse_args()
+    if args.output_dir is not None:
+        process_batch(args)
+        return
+    print(f"Processing {args.input_file}")
+    num_words, reused = count_file(args.input_file, args.output_file, args.engine, args.processes,
+                                   args.window_size, args.incremental)
+    if reused:
+        print(f"Input unchanged, kept {args.output_file}")
+    else:
+        print(f"Saved result to {args.output_file}")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Merge the partial-result shards written by `mp-pi.py --shard` into the final estimate.
+Usage: python reduce-pi.py <output_file> <shard_file> [<shard_file> ...]
+
+Every shard holds one task's inside count and number of points, and the number of
+points of the whole run. The reduce step checks that all tasks 0 .. num_tasks-1 of the
+same run are present exactly once and that each holds its full share of the points,
+sums the counts and writes the usual pi,num_points CSV.
+"""
+
+import csv
+import logging
+import sys
+from collections import Counter
+
+from pi_io import save_result
+
+logging.basicConfig(level=logging.INFO)
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    if len(sys.argv) < 3:
+        logging.error("Usage: python %s <output_file> <shard_file> [<shard_file> ...]", sys.argv[0])
+        sys.exit(1)
+    return sys.argv[1], sys.argv[2:]
+
+
+def load_shards(shard_files):
+    """
+    Read all shard files into one list of rows (dicts of ints), one row per task.
+    """
+    shards = []
+    for shard_file in shard_files:
+        with open(shard_file, newline="") as f:
+            shards.extend({key: int(value) for key, value in row.items()} for row in csv.DictReader(f))
+    return shards
+
+
+def check_shards(shards):
+    """
+    Return a list of problems (empty if the shards form one complete run).
+    """
+    if not shards:
+        return ["no shards found"]
+    if any("total_points" not in row for row in shards):
+        return ["shards without a total_points column (written by an older mp-pi.py)"]
+    if len({(row["seed"], row["num_tasks"], row["total_points"]) for row in shards}) != 1:
+        return ["shards come from different runs (seed, num_tasks or total_points differ)"]
+    problems = []
+    num_tasks = shards[0]["num_tasks"]
+    total_points = shards[0]["total_points"]
+    task_counts = Counter(row["task_id"] for row in shards)
+    duplicated = sorted(t for t, count in task_counts.items() if count > 1)
+    missing = sorted(set(range(num_tasks)) - set(task_counts))
+    if duplicated:
+        problems.append(f"duplicate tasks: {duplicated}")
+    if missing:
+        problems.append(f"missing tasks: {missing}")
+    # each task's share is fixed by calculate_shard in mp-pi.py
+    chunk_size, remainder = divmod(total_points, num_tasks)
+    short = sorted(row["task_id"] for row in shards
+                   if row["num_points"] != chunk_size + (1 if row["task_id"] < remainder else 0))
+    if short:
+        problems.append(f"tasks with the wrong number of points: {short}")
+    num_points = sum(row["num_points"] for row in shards)
+    if num_points != total_points:
+        problems.append(f"shards hold {num_points} points, the run asked for {total_points}")
+    return problems
+
+
+def reduce_shards(shards):
+    """
+    Sum the inside counts and points of all shards and compute pi.
+    """
+    num_inside = sum(row["num_inside"] for row in shards)
+    num_points = sum(row["num_points"] for row in shards)
+    return 4.0 * num_inside / num_points, num_points
+
+
+def main():
+    output_file, shard_files = parse_args()
+    shards = load_shards(shard_files)
+    problems = check_shards(shards)
+    if problems:
+        for problem in problems:
+            logging.error(f"Error: {problem}")
+        sys.exit(1)
+    pi, num_points = reduce_shards(shards)
+    save_result(pi, num_points, output_file)
+    logging.info(f"Merged {len(shards)} shards")
+    logging.info(f"Pi: {pi}")
+    logging.info(f"Saved result to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,230 @@
 #!/usr/bin/env python3
 
+"""
+Monte Carlo pi estimation with NumPy.
+Usage: python serial-numpy-pi.py <num_points> <output_file> [--block-size N]
+                                  [--target-stderr SE] [--max-seconds S]
+                                  [--sampler {random,qmc}] [--compare]
+                                  [--threads N]
+
+Points are drawn and reduced in fixed-size blocks so that peak memory stays
+at a few MB no matter how many points are requested.
+With --sampler qmc the points come from a scrambled Halton sequence instead of a
+pseudo-random generator (quasi-Monte Carlo). --compare runs both samplers over a
+ladder of point counts and writes a table of error versus wall time.
+With --threads N the points are split across N threads in one process. NumPy's
+random generators and reductions release the GIL, so the threads run in parallel
+without the process startup and pickling cost of a multiprocessing pool.
+"""
+
+import argparse
 import logging
-import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import pandas as pd
+
+from pi_io import save_result
+from pi_qmc import SAMPLERS, compare_samplers, count_inside_qmc, halton_scramblers, save_comparison
+from pi_stats import MIN_POINTS, binomial_stderr, precise_enough
 
 logging.basicConfig(level=logging.INFO)
 
+# 2**18 points per block: two float64 buffers of 2 MB each plus a 256 kB mask,
+# small enough to stay in cache on typical compute nodes.
+DEFAULT_BLOCK_SIZE = 2**18
+
 
 def parse_args():
     """
     Parse command line arguments.
     """
-    try:
-        num_points = int(sys.argv[1])
-        output_file = sys.argv[2]
-    except ValueError:
-        logging.error("Error: Number of points must be an integer")
-        sys.exit(1)
-    except IndexError:
-        logging.error("Error: Number of points and output file must be provided")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Monte Carlo pi estimation with NumPy")
+    parser.add_argument("num_points", type=int, help="total number of random points")
+    parser.add_argument("output_file", help="CSV file to write the result to")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f"points drawn per block (default: {DEFAULT_BLOCK_SIZE})")
+    parser.add_argument("--target-stderr", type=float, default=None,
+                        help="stop once the standard error of pi drops below this value "
+                             f"(checked after at least {MIN_POINTS} points)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="stop after this many seconds of sampling")
+    parser.add_argument("--sampler", choices=SAMPLERS, default="random",
+                        help="pseudo-random points or scrambled Halton points (default: random)")
+    parser.add_argument("--compare", action="store_true",
+                        help="write an error vs. wall time table for both samplers instead")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="number of threads sharing the work (default: 1)")
+    args = parser.parse_args()
+    if args.num_points < 1:
+        parser.error("num_points must be at least 1")
+    if args.block_size < 1:
+        parser.error("--block-size must be at least 1")
+    if args.threads < 1:
+        parser.error("--threads must be at least 1")
+    adaptive = args.target_stderr is not None or args.max_seconds is not None
+    if adaptive and (args.sampler == "qmc" or args.compare):
+        # the binomial standard error only holds for independent random points
+        parser.error("--target-stderr/--max-seconds require --sampler random")
+    return args
+
+
+def block_buffers(block_size):
+    """
+    Scratch buffers (x, y, inside mask) for count_inside_blocks.
+    """
+    return np.empty(block_size), np.empty(block_size), np.empty(block_size, dtype=bool)
 
-    return num_points, output_file
+
+def count_inside_blocks(rng, num_points, block_size=DEFAULT_BLOCK_SIZE, buffers=None):
+    """
+    Draw num_points random (x,y) in blocks of block_size and count how many fall
+    inside the unit circle. The buffers from block_buffers are reused for every block
+    (pass them in to reuse them across calls too); squaring and adding are done in
+    place so no temporaries are created per block.
+    """
+    if buffers is None:
+        buffers = block_buffers(min(block_size, num_points))
+    x, y, inside = buffers
+    block_size = min(block_size, len(x))
+    num_inside = 0
+    remaining = num_points
+    while remaining > 0:
+        n = min(block_size, remaining)
+        xb, yb, mask = x[:n], y[:n], inside[:n]
+        rng.random(out=xb)
+        rng.random(out=yb)
+        np.multiply(xb, xb, out=xb)
+        np.multiply(yb, yb, out=yb)
+        np.add(xb, yb, out=xb)
+        np.less_equal(xb, 1.0, out=mask)
+        num_inside += int(np.count_nonzero(mask))
+        remaining -= n
+    return num_inside
+
+
+def split_points(num_points, parts):
+    """
+    Split num_points into parts nearly equal sizes; returns a list of (start, n).
+    """
+    chunk_size, remainder = divmod(num_points, parts)
+    slices = []
+    start = 0
+    for i in range(parts):
+        n = chunk_size + (1 if i < remainder else 0)
+        slices.append((start, n))
+        start += n
+    return slices
 
 
-def calculate_pi(num_points):
+def count_inside_threaded(executor, rngs, buffers, num_points, block_size=DEFAULT_BLOCK_SIZE):
     """
-    Calculate pi using the Monte Carlo method with NumPy (vectorized).
+    Split num_points across the threads of executor, one generator from rngs and one set
+    of block buffers from buffers per thread, so threads never share memory they write to.
+    """
+    sizes = [n for _, n in split_points(num_points, len(rngs))]
+    return sum(executor.map(count_inside_blocks, rngs, sizes, [block_size] * len(rngs), buffers))
+
+
+def thread_rngs(seed, threads):
+    """
+    One independent generator per thread, spawned from a single SeedSequence.
+    """
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(threads)]
+
+
+def thread_buffers(threads, block_size):
+    """
+    One set of block buffers per thread, allocated once and reused for every call.
+    """
+    return [block_buffers(block_size) for _ in range(threads)]
+
+
+def calculate_pi(num_points, block_size=DEFAULT_BLOCK_SIZE, sampler="random", threads=1):
+    """
+    Calculate pi using the Monte Carlo method with NumPy (vectorized, streamed in blocks).
     """
     master = np.random.default_rng()
     seed = int(master.integers(0, 2**32))
-    rng = np.random.default_rng(seed)
-    logging.info("Calculating pi using %d points (NumPy)", num_points)
-    x = rng.random(num_points)
-    y = rng.random(num_points)
-    num_inside = np.sum(x**2 + y**2 <= 1)
+    logging.info("Calculating pi using %d points (NumPy, %s sampler, block size %d, %d threads)",
+                 num_points, sampler, block_size, threads)
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            if sampler == "qmc":
+                # each thread skips ahead to its own slice of the sequence
+                starts, sizes = zip(*split_points(num_points, threads))
+                halton_scramblers(seed)  # build the tables once, before the threads need them
+                counts = executor.map(count_inside_qmc, [seed] * threads,
+                                      starts, sizes, [block_size] * threads)
+                num_inside = sum(counts)
+            else:
+                buffers = thread_buffers(threads, min(block_size, num_points))
+                num_inside = count_inside_threaded(executor, thread_rngs(seed, threads), buffers,
+                                                   num_points, block_size)
+    elif sampler == "qmc":
+        num_inside = count_inside_qmc(seed, 0, num_points, block_size)
+    else:
+        rng = np.random.default_rng(seed)
+        num_inside = count_inside_blocks(rng, num_points, block_size)
     return 4.0 * num_inside / num_points
 
 
-def save_result(pi, num_points, output_file):
+def calculate_pi_adaptive(max_points, target_stderr=None, max_seconds=None,
+                          block_size=DEFAULT_BLOCK_SIZE, threads=1):
     """
-    Save the result to a CSV file.
+    Calculate pi one block (per thread) at a time and stop as soon as the standard error
+    drops below target_stderr (after at least MIN_POINTS points), max_seconds have passed,
+    or max_points are used up.
+    Returns (pi, num_points, stderr).
     """
-    df = pd.DataFrame({"pi": [pi], "num_points": [num_points]})
-    df.to_csv(output_file, index=False)
+    master = np.random.default_rng()
+    seed = int(master.integers(0, 2**32))
+    logging.info("Calculating pi using up to %d points (NumPy, %d threads, target stderr %s, max seconds %s)",
+                 max_points, threads, target_stderr, max_seconds)
+    rngs = thread_rngs(seed, threads)
+    # allocated once here and reused in every round
+    buffers = thread_buffers(threads, min(block_size, max_points))
+    start = time.perf_counter()
+    num_inside = 0
+    num_points = 0
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while num_points < max_points:
+            n = min(block_size * threads, max_points - num_points)
+            if threads > 1:
+                num_inside += count_inside_threaded(executor, rngs, buffers, n, block_size)
+            else:
+                num_inside += count_inside_blocks(rngs[0], n, block_size, buffers[0])
+            num_points += n
+            if precise_enough(num_inside, num_points, target_stderr):
+                break
+            if max_seconds is not None and time.perf_counter() - start >= max_seconds:
+                break
+    pi = 4.0 * num_inside / num_points
+    return pi, num_points, binomial_stderr(num_inside, num_points)
 
 
 def main():
     """
     Main function.
     """
-    num_points, output_file = parse_args()
-    pi = calculate_pi(num_points)
-    save_result(pi, num_points, output_file)
+    args = parse_args()
+    num_points = args.num_points
+    if args.compare:
+        rows = compare_samplers(
+            lambda n, sampler: calculate_pi(n, args.block_size, sampler, args.threads), num_points)
+        save_comparison(rows, args.output_file)
+        logging.info("Saved sampler comparison to %s", args.output_file)
+        return
+    if args.target_stderr is None and args.max_seconds is None:
+        pi = calculate_pi(num_points, args.block_size, args.sampler, args.threads)
+    else:
+        pi, num_points, stderr = calculate_pi_adaptive(num_points, args.target_stderr,
+                                                       args.max_seconds, args.block_size,
+                                                       args.threads)
+        logging.info("Used %d points, stderr %.3g, 95%% CI [%.6f, %.6f]",
+                     num_points, stderr, pi - 1.96 * stderr, pi + 1.96 * stderr)
+    save_result(pi, num_points, args.output_file)
     logging.info("Pi: %s", pi)
-    logging.info("Saved result to %s", output_file)
+    logging.info("Saved result to %s", args.output_file)
 
 
 if __name__ == "__main__":
@@ -1,27 +1,36 @@
 #!/usr/bin/env python3
 
+import argparse
 import random
 import logging
-import sys
-import pandas as pd
+import time
+
+from pi_io import save_result
+from pi_stats import MIN_POINTS, binomial_stderr, precise_enough
 
 logging.basicConfig(level=logging.INFO)
 
+# number of points between two precision checks in adaptive mode
+ROUND_SIZE = 100000
+
+
 def parse_args():
     """
     Parse command line arguments.
     """
-    try:
-        num_points = int(sys.argv[1])
-        output_file = sys.argv[2]
-    except ValueError:
-        logging.error("Error: Number of points must be an integer")
-        sys.exit(1)
-    except IndexError:
-        logging.error("Error: Number of points and output file must be provided")
-        sys.exit(1)
-
-    return num_points, output_file
+    parser = argparse.ArgumentParser(description="Monte Carlo pi estimation (serial)")
+    parser.add_argument("num_points", type=int,
+                        help="number of random points (upper bound in adaptive mode)")
+    parser.add_argument("output_file", help="CSV file to write the result to")
+    parser.add_argument("--target-stderr", type=float, default=None,
+                        help="stop once the standard error of pi drops below this value "
+                             f"(checked after at least {MIN_POINTS} points)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="stop after this many seconds of sampling")
+    args = parser.parse_args()
+    if args.num_points < 1:
+        parser.error("num_points must be at least 1")
+    return args
 
 
 def calculate_pi(num_points):
@@ -40,22 +49,53 @@ def calculate_pi(num_points):
             num_inside += 1
     return 4 * num_inside / num_points
 
-def save_result(pi, num_points, output_file):
+
+def calculate_pi_adaptive(max_points, target_stderr=None, max_seconds=None):
     """
-    Save the result to a CSV file.
+    Calculate pi in rounds of ROUND_SIZE points and stop as soon as the standard error
+    drops below target_stderr (after at least MIN_POINTS points), max_seconds have passed,
+    or max_points are used up.
+    Returns (pi, num_points, stderr).
     """
-    df = pd.DataFrame({'pi': [pi], 'num_points': [num_points]})
-    df.to_csv(output_file, index=False)
+    master = random.Random()
+    seed = master.randint(0, 2**32 - 1)
+    random.seed(seed)
+    logging.info(f"Calculating pi using up to {max_points} points "
+                 f"(target stderr {target_stderr}, max seconds {max_seconds})")
+    start = time.perf_counter()
+    num_inside = 0
+    num_points = 0
+    while num_points < max_points:
+        n = min(ROUND_SIZE, max_points - num_points)
+        for _ in range(n):
+            x = random.random()
+            y = random.random()
+            if x**2 + y**2 <= 1:
+                num_inside += 1
+        num_points += n
+        if precise_enough(num_inside, num_points, target_stderr):
+            break
+        if max_seconds is not None and time.perf_counter() - start >= max_seconds:
+            break
+    pi = 4 * num_inside / num_points
+    return pi, num_points, binomial_stderr(num_inside, num_points)
+
 
 def main():
     """
     Main function.
     """
-    num_points, output_file = parse_args()
-    pi = calculate_pi(num_points)
-    save_result(pi, num_points, output_file)
+    args = parse_args()
+    num_points = args.num_points
+    if args.target_stderr is None and args.max_seconds is None:
+        pi = calculate_pi(num_points)
+    else:
+        pi, num_points, stderr = calculate_pi_adaptive(num_points, args.target_stderr, args.max_seconds)
+        logging.info(f"Used {num_points} points, stderr {stderr:.3g}, "
+                     f"95% CI [{pi - 1.96 * stderr:.6f}, {pi + 1.96 * stderr:.6f}]")
+    save_result(pi, num_points, args.output_file)
     logging.info(f"Pi: {pi}")
-    logging.info(f"Saved result to {output_file}")
+    logging.info(f"Saved result to {args.output_file}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()